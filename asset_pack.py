@@ -0,0 +1,301 @@
+"""
+猜卡图片资源包。
+
+本地模式下, 选项缩略图、题目图片和答案图片原本是 resources 目录下成千上万个小文件,
+每次出题都要逐个查找 inode 并打开。资源包把它们合并为一个文件, 运行时通过 mmap 只读映射,
+按索引切出 memoryview, 读取单个资源不需要 open/stat 等文件系统调用。
+插件解码或发送图片时仍会把该资源复制一份 (交给 Pillow 或适配器的字节串), 资源包省掉的是文件查找与读取。
+
+资源包中的条目优先于 resources 目录下的同名文件。更新图片后需要重新打包,
+verify --resources 会列出与打包时内容不一致的条目 (stale)。
+
+文件格式 (小端序):
+    文件头 (32 字节): magic "PJSKPACK" | 版本 u32 | 条目数 u32 | 索引偏移 u64 | 索引长度 u64
+    数据区: 各资源编码后的字节依次排列
+    索引区: 每个条目为 路径长度 u16 | 路径 (UTF-8, 以 / 分隔的相对路径) | 偏移 u64 | 长度 u32 | CRC32 u32
+
+- member_thumb/ 下的缩略图在打包时预先缩放为 128x128 并重新编码为 PNG;
+- questions/ 和 member/ 下的题目与答案图片按原始编码字节存入。
+
+用法:
+    python asset_pack.py build --resources resources
+    python asset_pack.py verify resources/assets.pack --decode
+"""
+import argparse
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+ASSET_PACK_NAME = "assets.pack"
+PACK_MAGIC = b"PJSKPACK"
+PACK_VERSION = 1
+THUMB_SIZE = 128
+
+# 打包的目录 -> 是否需要预先缩放为缩略图
+PACKED_DIRS = {
+    "member_thumb": True,
+    "questions": False,
+    "member": False,
+}
+
+_HEADER = struct.Struct("<8sIIQQ")
+_PATH_LEN = struct.Struct("<H")
+_ENTRY = struct.Struct("<QII")
+
+
+class AssetPackError(Exception):
+    """资源包格式错误或已损坏。"""
+
+
+class AssetPack:
+    """只读的资源包, 通过 mmap 访问。get() 返回的 memoryview 在 close() 之前有效。"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < _HEADER.size:
+                raise AssetPackError(f"{self.path} 太小，不是有效的资源包")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+            self._index = self._read_index(size)
+        except Exception:
+            self.close()
+            raise
+
+    def _read_index(self, size: int) -> Dict[str, Tuple[int, int, int]]:
+        magic, version, count, index_offset, index_length = _HEADER.unpack_from(self._view, 0)
+        if magic != PACK_MAGIC:
+            raise AssetPackError(f"{self.path} 不是资源包文件")
+        if version != PACK_VERSION:
+            raise AssetPackError(f"不支持的资源包版本 {version}，请重新打包")
+        if index_offset + index_length > size:
+            raise AssetPackError(f"{self.path} 的索引超出文件末尾，文件可能被截断")
+
+        index_bytes = self._view[index_offset:index_offset + index_length]
+        index: Dict[str, Tuple[int, int, int]] = {}
+        pos = 0
+        try:
+            for _ in range(count):
+                (path_len,) = _PATH_LEN.unpack_from(index_bytes, pos)
+                pos += _PATH_LEN.size
+                rel = bytes(index_bytes[pos:pos + path_len]).decode("utf-8")
+                pos += path_len
+                offset, length, crc = _ENTRY.unpack_from(index_bytes, pos)
+                pos += _ENTRY.size
+                if offset + length > index_offset:
+                    raise AssetPackError(f"资源 {rel} 的数据超出数据区")
+                index[rel] = (offset, length, crc)
+        except (struct.error, UnicodeDecodeError) as e:
+            raise AssetPackError(f"{self.path} 的索引已损坏: {e}") from e
+        index_bytes.release()
+        return index
+
+    def __contains__(self, relative_path: str) -> bool:
+        return relative_path in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def paths(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def get(self, relative_path: str) -> Optional[memoryview]:
+        """返回指向映射区域的资源切片 (不复制)，资源不存在时返回 None"""
+        entry = self._index.get(relative_path)
+        if entry is None:
+            return None
+        offset, length, _ = entry
+        return self._view[offset:offset + length]
+
+    def entry(self, relative_path: str) -> Tuple[int, int]:
+        """返回资源的 (长度, CRC32)"""
+        _, length, crc = self._index[relative_path]
+        return length, crc
+
+    def check(self, relative_path: str) -> bool:
+        """校验资源的 CRC32"""
+        offset, length, crc = self._index[relative_path]
+        return zlib.crc32(self._view[offset:offset + length]) == crc
+
+    def close(self):
+        view = getattr(self, "_view", None)
+        if view is not None:
+            view.release()
+            self._view = None
+        mm = getattr(self, "_mmap", None)
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                # 仍有调用方持有切片, 由垃圾回收在切片释放后关闭映射
+                pass
+            self._mmap = None
+        self._file.close()
+
+
+# --- 打包 ---
+def _encode_thumbnail(path: Path) -> bytes:
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.load()
+        if img.size != (THUMB_SIZE, THUMB_SIZE):
+            img = img.resize((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, "PNG", optimize=True)
+    return buf.getvalue()
+
+
+def collect_sources(resources_dir: Path) -> List[Tuple[str, Path, bool]]:
+    """列出需要打包的资源, 返回 (相对路径, 源文件, 是否为缩略图)，按路径排序保证输出稳定"""
+    sources = []
+    for dirname, is_thumb in PACKED_DIRS.items():
+        root = resources_dir / dirname
+        if not root.is_dir():
+            continue
+        for path in root.rglob("*.png"):
+            sources.append((path.relative_to(resources_dir).as_posix(), path, is_thumb))
+    sources.sort()
+    return sources
+
+
+def build_pack(resources_dir: Path, output: Path) -> Dict[str, int]:
+    """将 resources 目录下的图片打包为 output，先写入临时文件再原子替换"""
+    sources = collect_sources(resources_dir)
+    entries = []
+    stats = {"entries": 0, "thumbnails": 0, "bytes": 0}
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(b"\0" * _HEADER.size)  # 占位, 最后回填
+            for rel, path, is_thumb in sources:
+                data = _encode_thumbnail(path) if is_thumb else path.read_bytes()
+                entries.append((rel, f.tell(), len(data), zlib.crc32(data)))
+                f.write(data)
+                stats["thumbnails"] += is_thumb
+                if len(entries) % 1000 == 0:
+                    print(f"已打包 {len(entries)}/{len(sources)}", file=sys.stderr)
+
+            index_offset = f.tell()
+            for rel, offset, length, crc in entries:
+                encoded = rel.encode("utf-8")
+                f.write(_PATH_LEN.pack(len(encoded)))
+                f.write(encoded)
+                f.write(_ENTRY.pack(offset, length, crc))
+            index_length = f.tell() - index_offset
+            stats["bytes"] = f.tell()
+
+            f.seek(0)
+            f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(entries), index_offset, index_length))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output)
+    finally:
+        if tmp_path.exists():
+            os.remove(tmp_path)
+
+    stats["entries"] = len(entries)
+    return stats
+
+
+def _is_stale(pack: AssetPack, rel: str, path: Path, is_thumb: bool, pack_mtime: float) -> bool:
+    """resources 目录中的图片在打包之后是否被修改过"""
+    stat = path.stat()
+    if is_thumb:
+        # 缩略图打包时重新编码过, 无法逐字节比较
+        return stat.st_mtime > pack_mtime
+    length, crc = pack.entry(rel)
+    if stat.st_size != length:
+        return True
+    return zlib.crc32(path.read_bytes()) != crc
+
+
+def verify_pack(pack_path: Path, decode: bool = False, resources_dir: Optional[Path] = None) -> Dict[str, List[str]]:
+    """
+    校验资源包: 所有条目的 CRC32; decode 为 True 时解码每张图片并检查缩略图尺寸;
+    指定 resources_dir 时, 还会列出目录中存在但未打包的图片 (unpacked), 以及打包后
+    被修改过的图片 (stale): 原样存入的图片比较长度与 CRC32, 缩略图比较文件与资源包的修改时间。
+    """
+    problems: Dict[str, List[str]] = {
+        "corrupt": [], "undecodable": [], "bad_thumb_size": [], "unpacked": [], "stale": [],
+    }
+    pack = AssetPack(pack_path)
+    try:
+        for rel in pack.paths():
+            if not pack.check(rel):
+                problems["corrupt"].append(rel)
+                continue
+            if decode:
+                from PIL import Image
+
+                try:
+                    with Image.open(io.BytesIO(pack.get(rel))) as img:
+                        img.load()
+                        size = img.size
+                except Exception:
+                    problems["undecodable"].append(rel)
+                    continue
+                if rel.startswith("member_thumb/") and size != (THUMB_SIZE, THUMB_SIZE):
+                    problems["bad_thumb_size"].append(rel)
+        if resources_dir is not None:
+            pack_mtime = os.stat(pack_path).st_mtime
+            for rel, path, is_thumb in collect_sources(resources_dir):
+                if rel not in pack:
+                    problems["unpacked"].append(rel)
+                elif _is_stale(pack, rel, path, is_thumb, pack_mtime):
+                    problems["stale"].append(rel)
+    finally:
+        pack.close()
+    return problems
+
+
+def main(argv=None):
+    plugin_dir = Path(__file__).resolve().parent
+    default_resources = plugin_dir / "resources"
+    parser = argparse.ArgumentParser(description="打包或校验猜卡图片资源包")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="将 resources 目录下的图片打包")
+    build.add_argument("--resources", type=Path, default=default_resources, help="资源目录, 默认为插件的 resources 目录")
+    build.add_argument("--output", type=Path, default=None, help=f"输出文件, 默认为 <resources>/{ASSET_PACK_NAME}")
+
+    verify = subparsers.add_parser("verify", help="校验资源包")
+    verify.add_argument("pack", type=Path, nargs="?", default=default_resources / ASSET_PACK_NAME, help="资源包路径")
+    verify.add_argument("--decode", action="store_true", help="解码每张图片并检查缩略图尺寸 (需要 Pillow)")
+    verify.add_argument("--resources", type=Path, default=None, help="同时检查该目录中是否有未打包或打包后被修改的图片")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.command == "build":
+        output = args.output or args.resources / ASSET_PACK_NAME
+        result = build_pack(args.resources, output)
+        failed = False
+    else:
+        try:
+            problems = verify_pack(args.pack, decode=args.decode, resources_dir=args.resources)
+        except (OSError, AssetPackError) as e:
+            print(f"无法打开资源包: {e}", file=sys.stderr)
+            return 1
+        result = {key: len(value) for key, value in problems.items()}
+        for key, paths in problems.items():
+            for rel in paths[:20]:
+                print(f"{key}: {rel}", file=sys.stderr)
+        failed = any(problems.values())
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(result, ensure_ascii=False))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
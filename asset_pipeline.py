@@ -0,0 +1,244 @@
+"""
+离线生成猜卡所需的图片资源。
+
+根据 guess_cards.json, 从原始卡面 `<source>/member/<assetbundleName>/card_{normal|after_training}.png`
+生成:
+- 题目图片 `questions/{id}_card_{state}_{easy|normal|hard}.png`: 按难度裁剪局部并模糊;
+- 选项缩略图 `member_thumb/{assetbundleName}_{state}.png`: 128x128;
+- 答案图片 `member/<assetbundleName>/card_{state}.png`: 压缩后的完整卡面 (源目录与输出目录不同时)。
+
+每张原始卡面作为一个任务分发到进程池, 裁剪与模糊用 NumPy 向量化实现。
+输出目录中的 `.pipeline_manifest.json` 记录每个输出对应的源文件哈希与处理参数,
+二者都未变化且输出文件存在时跳过。
+
+用法 (需要 Pillow 和 numpy):
+    python asset_pipeline.py --source /path/to/raw_assets --output resources --jobs 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# 修改任何处理参数后递增, 使已有输出全部失效
+PIPELINE_VERSION = 1
+MANIFEST_NAME = ".pipeline_manifest.json"
+
+CARD_STATES = ("normal", "after_training")
+THUMB_SIZE = 128
+ANSWER_MAX_WIDTH = 1024
+QUESTION_MAX_SIDE = 512
+
+# 难度 -> (裁剪边长占短边的比例, 模糊半径, 模糊次数)
+DIFFICULTY_PARAMS = {
+    "easy": (0.55, 1, 1),
+    "normal": (0.40, 2, 2),
+    "hard": (0.28, 3, 3),
+}
+
+
+# --- 图像处理 ---
+def box_blur(arr: np.ndarray, radius: int, passes: int = 1) -> np.ndarray:
+    """可分离的盒式模糊, 基于累积和实现; 多次迭代近似高斯模糊。arr 形状为 (H, W, C)。"""
+    if radius <= 0 or passes <= 0:
+        return arr
+    out = arr.astype(np.float32)
+    size = 2 * radius + 1
+    for _ in range(passes):
+        for axis in (0, 1):
+            pad = [(0, 0)] * out.ndim
+            pad[axis] = (radius + 1, radius)
+            padded = np.pad(out, pad, mode="edge")
+            csum = np.cumsum(padded, axis=axis, dtype=np.float32)
+            upper = np.take(csum, np.arange(size, csum.shape[axis]), axis=axis)
+            lower = np.take(csum, np.arange(0, csum.shape[axis] - size), axis=axis)
+            out = (upper - lower) / size
+    return np.clip(out + 0.5, 0, 255).astype(np.uint8)
+
+
+def crop_box(width: int, height: int, fraction: float, seed: int) -> Tuple[int, int, int, int]:
+    """在图片中部区域确定性地选取一个正方形裁剪框"""
+    side = max(1, int(min(width, height) * fraction))
+    rng = np.random.default_rng(seed)
+    # 避开最边缘 10% 的区域, 那里通常是边框或背景
+    margin_x = int(width * 0.1)
+    margin_y = int(height * 0.1)
+    max_x = max(margin_x, width - side - margin_x)
+    max_y = max(margin_y, height - side - margin_y)
+    x = int(rng.integers(min(margin_x, max_x), max_x + 1))
+    y = int(rng.integers(min(margin_y, max_y), max_y + 1))
+    return x, y, x + side, y + side
+
+
+def make_question(arr: np.ndarray, difficulty: str, seed: int) -> Image.Image:
+    fraction, radius, passes = DIFFICULTY_PARAMS[difficulty]
+    height, width = arr.shape[:2]
+    x0, y0, x1, y1 = crop_box(width, height, fraction, seed)
+    region = box_blur(arr[y0:y1, x0:x1], radius, passes)
+    img = Image.fromarray(region)
+    if max(img.size) > QUESTION_MAX_SIDE:
+        img.thumbnail((QUESTION_MAX_SIDE, QUESTION_MAX_SIDE), Image.LANCZOS)
+    return img
+
+
+def make_thumbnail(img: Image.Image) -> Image.Image:
+    """居中裁剪为正方形后缩放到 128x128"""
+    width, height = img.size
+    side = min(width, height)
+    left = (width - side) // 2
+    top = (height - side) // 2
+    return img.crop((left, top, left + side, top + side)).resize((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
+
+
+def make_answer(img: Image.Image) -> Image.Image:
+    if img.width <= ANSWER_MAX_WIDTH:
+        return img
+    height = round(img.height * ANSWER_MAX_WIDTH / img.width)
+    return img.resize((ANSWER_MAX_WIDTH, height), Image.LANCZOS)
+
+
+def _save(img: Image.Image, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    img.save(tmp_path, "PNG", optimize=True)
+    os.replace(tmp_path, path)
+
+
+# --- 任务划分 ---
+def card_outputs(card: Dict, state: str, with_answer: bool) -> List[str]:
+    """一张原始卡面对应的所有输出 (相对路径)"""
+    outputs = [f"questions/{card['id']}_card_{state}_{difficulty}.png" for difficulty in DIFFICULTY_PARAMS]
+    outputs.append(f"member_thumb/{card['assetbundleName']}_{state}.png")
+    if with_answer:
+        outputs.append(f"member/{card['assetbundleName']}/card_{state}.png")
+    return outputs
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def params_digest(source_digest: str) -> str:
+    payload = json.dumps([PIPELINE_VERSION, DIFFICULTY_PARAMS, THUMB_SIZE, ANSWER_MAX_WIDTH, QUESTION_MAX_SIDE])
+    return hashlib.sha256((source_digest + payload).encode()).hexdigest()
+
+
+def process_card(source_path: str, output_dir: str, card: Dict, state: str, with_answer: bool) -> List[str]:
+    """进程池中执行: 读取一张原始卡面并生成全部输出, 返回生成的相对路径"""
+    out_dir = Path(output_dir)
+    with Image.open(source_path) as src:
+        img = src.convert("RGB")
+    arr = np.asarray(img)
+
+    written = []
+    for difficulty in DIFFICULTY_PARAMS:
+        # 种子只取决于卡牌、状态和难度, 重复生成得到相同结果
+        seed = int(hashlib.md5(f"{card['id']}:{state}:{difficulty}".encode()).hexdigest()[:8], 16)
+        rel = f"questions/{card['id']}_card_{state}_{difficulty}.png"
+        _save(make_question(arr, difficulty, seed), out_dir / rel)
+        written.append(rel)
+
+    rel = f"member_thumb/{card['assetbundleName']}_{state}.png"
+    _save(make_thumbnail(img), out_dir / rel)
+    written.append(rel)
+
+    if with_answer:
+        rel = f"member/{card['assetbundleName']}/card_{state}.png"
+        _save(make_answer(img), out_dir / rel)
+        written.append(rel)
+    return written
+
+
+def load_manifest(output_dir: Path) -> Dict[str, str]:
+    try:
+        with open(output_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(output_dir: Path, manifest: Dict[str, str]):
+    tmp_path = output_dir / f"{MANIFEST_NAME}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=0, sort_keys=True)
+    os.replace(tmp_path, output_dir / MANIFEST_NAME)
+
+
+def run_pipeline(source_dir: Path, output_dir: Path, cards: List[Dict], jobs: Optional[int] = None,
+                 force: bool = False) -> Dict[str, int]:
+    with_answer = source_dir.resolve() != output_dir.resolve()
+    manifest = {} if force else load_manifest(output_dir)
+    stats = {"sources": 0, "missing": 0, "skipped": 0, "generated": 0, "failed": 0}
+
+    tasks = []
+    for card in cards:
+        for state in CARD_STATES:
+            source_path = source_dir / "member" / card["assetbundleName"] / f"card_{state}.png"
+            if not source_path.exists():
+                stats["missing"] += 1
+                continue
+            stats["sources"] += 1
+            digest = params_digest(file_digest(source_path))
+            outputs = card_outputs(card, state, with_answer)
+            if all(manifest.get(rel) == digest and (output_dir / rel).exists() for rel in outputs):
+                stats["skipped"] += 1
+                continue
+            tasks.append((str(source_path), card, state, digest))
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                pool.submit(process_card, source_path, str(output_dir), card, state, with_answer): (source_path, digest)
+                for source_path, card, state, digest in tasks
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                source_path, digest = futures[future]
+                try:
+                    for rel in future.result():
+                        manifest[rel] = digest
+                    stats["generated"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"处理 {source_path} 失败: {e}", file=sys.stderr)
+                if i % 200 == 0:
+                    # 定期保存, 中断后重跑可以跳过已完成的部分
+                    save_manifest(output_dir, manifest)
+                    print(f"进度: {i}/{len(tasks)}", file=sys.stderr)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    save_manifest(output_dir, manifest)
+    return stats
+
+
+def main(argv=None):
+    plugin_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="生成猜卡题目图片、缩略图与答案图片")
+    parser.add_argument("--source", required=True, type=Path, help="原始卡面根目录 (包含 member/<assetbundleName>/card_*.png)")
+    parser.add_argument("--output", type=Path, default=plugin_dir / "resources", help="输出目录, 默认为插件的 resources 目录")
+    parser.add_argument("--cards", type=Path, default=plugin_dir / "resources" / "guess_cards.json", help="卡牌列表")
+    parser.add_argument("--jobs", type=int, default=None, help="进程数, 默认为 CPU 核数")
+    parser.add_argument("--force", action="store_true", help="忽略清单, 重新生成所有输出")
+    args = parser.parse_args(argv)
+
+    with open(args.cards, "r", encoding="utf-8") as f:
+        cards = json.load(f)
+
+    started = time.perf_counter()
+    stats = run_pipeline(args.source, args.output, cards, jobs=args.jobs, force=args.force)
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(stats, ensure_ascii=False))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+猜卡插件加载耗时测量。
+
+每次测量都在新的子进程中进行 (避免 sys.modules 缓存), 分别记录:
+- import_ms: 导入 main.py 的耗时;
+- construct_ms: GuessCardPlugin.__init__ 的耗时 (AstrBot 重载插件时阻塞事件循环的部分);
+- ready_ms: 从构造开始到后台初始化完成 (_wait_ready 返回) 的耗时;
+- heavy_modules: 导入 main.py 后已被加载的重量级依赖, 期望为空。
+
+超过 --max-import-ms / --max-construct-ms 或导入时加载了重量级依赖时退出码为 1, 可直接用于 CI 断言。
+
+用法 (在插件根目录下):
+    python -m benchmarks.bench_import --runs 10 --max-import-ms 200
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.harness import PLUGIN_ROOT
+
+HEAVY_MODULES = ("PIL", "pilmoji", "aiohttp", "jinja2", "numpy")
+
+_PROBE = """
+import asyncio, json, sys, tempfile, time
+from pathlib import Path
+from benchmarks.harness import FakeContext, default_config, import_plugin_module, install_astrbot_stubs
+
+HEAVY_MODULES = {heavy!r}
+tmp = tempfile.TemporaryDirectory(prefix="guess_card_import_")
+install_astrbot_stubs(Path(tmp.name) / "data")
+
+started = time.perf_counter()
+module = import_plugin_module()
+import_ms = (time.perf_counter() - started) * 1000
+heavy = sorted(name for name in HEAVY_MODULES if name in sys.modules)
+
+async def construct():
+    started = time.perf_counter()
+    plugin = module.GuessCardPlugin(FakeContext(), default_config("http://127.0.0.1:9", use_local_resources=True))
+    construct_ms = (time.perf_counter() - started) * 1000
+    wait_ready = getattr(plugin, "_wait_ready", None)  # 旧版本在构造函数中同步初始化
+    if wait_ready is not None:
+        await wait_ready()
+    ready_ms = (time.perf_counter() - started) * 1000
+    await plugin.terminate()
+    return construct_ms, ready_ms
+
+construct_ms, ready_ms = asyncio.run(construct())
+print(json.dumps({{"import_ms": import_ms, "construct_ms": construct_ms, "ready_ms": ready_ms, "heavy_modules": heavy}}))
+"""
+
+
+def measure_once() -> dict:
+    probe = _PROBE.format(heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", probe], cwd=PLUGIN_ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _summary(samples):
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="猜卡插件加载耗时测量")
+    parser.add_argument("--runs", type=int, default=10, help="子进程测量次数")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="导入耗时中位数的上限")
+    parser.add_argument("--max-construct-ms", type=float, default=None, help="构造耗时中位数的上限")
+    parser.add_argument("--output", help="结果 JSON 的输出路径, 默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(args.runs)]
+    heavy = sorted({name for run in runs for name in run["heavy_modules"]})
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "runs": args.runs,
+        },
+        "results": {
+            "import": _summary([run["import_ms"] for run in runs]),
+            "construct": _summary([run["construct_ms"] for run in runs]),
+            "ready": _summary([run["ready_ms"] for run in runs]),
+            "heavy_modules_at_import": heavy,
+        },
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    failures = []
+    if heavy:
+        failures.append(f"导入时加载了重量级依赖: {', '.join(heavy)}")
+    if args.max_import_ms is not None and report["results"]["import"]["median_ms"] > args.max_import_ms:
+        failures.append(f"导入耗时 {report['results']['import']['median_ms']:.1f}ms 超过上限 {args.max_import_ms}ms")
+    if args.max_construct_ms is not None and report["results"]["construct"]["median_ms"] > args.max_construct_ms:
+        failures.append(f"构造耗时 {report['results']['construct']['median_ms']:.1f}ms 超过上限 {args.max_construct_ms}ms")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
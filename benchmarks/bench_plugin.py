@@ -0,0 +1,199 @@
+"""
+猜卡插件基准测试。
+
+测量开局 (start_new_game + 选项图生成) 的吞吐与延迟、答题处理吞吐、
+排行榜渲染耗时以及 SQLite 辅助方法的吞吐, 结果以 JSON 输出, 便于不同版本间对比。
+
+用法 (在插件根目录下):
+    python -m benchmarks.bench_plugin --rounds 200 --rows 10000,100000,1000000 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.harness import (
+    CURRENT_SESSION,
+    FakeEvent,
+    PluginEnv,
+    ResourceServer,
+    default_config,
+    drain,
+    percentile,
+    seed_user_stats,
+)
+
+
+def _latency_summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0,
+    }
+
+
+async def bench_rounds(env: PluginEnv, rounds: int) -> Dict:
+    """完整跑 rounds 轮游戏: 开局 -> 一次正确回答 -> 公布答案。"""
+    plugin = env.plugin
+    start_latencies = []
+    t0 = time.perf_counter()
+    for i in range(rounds):
+        session_id = f"bench:group:{i}"
+        CURRENT_SESSION.set(session_id)
+        event = FakeEvent(session_id, "1", "bench", "猜卡", group_id=str(i))
+        handler = plugin.start_guess_card(event)
+
+        started = time.perf_counter()
+        first = await handler.__anext__()
+        start_latencies.append(time.perf_counter() - started)
+        if first.kind != "chain":
+            raise RuntimeError(f"开局失败: {first!r}")
+
+        answer = str(env.answer_for(session_id))
+        env.router.feed(FakeEvent(session_id, "2", "winner", answer, group_id=str(i)))
+        await drain(handler)
+    elapsed = time.perf_counter() - t0
+    return {
+        "rounds": rounds,
+        "rounds_per_sec": rounds / elapsed if elapsed else 0.0,
+        "start_latency": _latency_summary(start_latencies),
+    }
+
+
+async def bench_options_image(env: PluginEnv, repeats: int) -> Dict:
+    """单独测量选项网格图的生成耗时 (25 个缩略图)。"""
+    plugin = env.plugin
+    cards = plugin.guess_cards[:25]
+    options = [
+        {"id": c["id"], "relative_thumb_path": f"member_thumb/{c['assetbundleName']}_normal.png"}
+        for c in cards
+    ]
+    samples = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        await plugin._create_options_image(options, cols=5)
+        samples.append(time.perf_counter() - t)
+    return _latency_summary(samples)
+
+
+async def bench_answers(env: PluginEnv, answers: int) -> Dict:
+    """在一轮游戏中连续提交 answers 个错误答案, 测量答题处理吞吐。"""
+    plugin = env.plugin
+    session_id = "bench:answers"
+    CURRENT_SESSION.set(session_id)
+    event = FakeEvent(session_id, "1", "bench", "猜卡", group_id="answers")
+    handler = plugin.start_guess_card(event)
+    await handler.__anext__()
+    correct_id = env.answer_for(session_id)
+    wrong_id = str(correct_id + 100000)
+
+    for i in range(answers):
+        env.router.feed(FakeEvent(session_id, str(100 + i % 50), f"user{i % 50}", wrong_id, group_id="answers"))
+    env.router.feed(FakeEvent(session_id, "2", "winner", str(correct_id), group_id="answers"))
+
+    t = time.perf_counter()
+    await drain(handler)
+    elapsed = time.perf_counter() - t
+    return {"answers": answers, "answers_per_sec": answers / elapsed if elapsed else 0.0}
+
+
+async def bench_ranking(env: PluginEnv, rows: int, repeats: int) -> Dict:
+    """在 rows 行 user_stats 下测量排行榜渲染与个人分数查询耗时。"""
+    plugin = env.plugin
+    t = time.perf_counter()
+    seed_user_stats(plugin.db_path, rows)
+    seed_seconds = time.perf_counter() - t
+
+    ranking_samples, score_samples = [], []
+    for _ in range(repeats):
+        event = FakeEvent("bench:rank", "10000000", "玩家0", "猜卡排行榜", group_id="rank")
+        t = time.perf_counter()
+        results = await drain(plugin.show_ranking(event))
+        ranking_samples.append(time.perf_counter() - t)
+        if not results or results[0].kind != "image":
+            raise RuntimeError(f"排行榜渲染失败: {results!r}")
+
+        event = FakeEvent("bench:rank", "10000000", "玩家0", "猜卡分数", group_id="rank")
+        t = time.perf_counter()
+        await drain(plugin.show_user_score(event))
+        score_samples.append(time.perf_counter() - t)
+
+    return {
+        "rows": rows,
+        "seed_seconds": seed_seconds,
+        "ranking_render": _latency_summary(ranking_samples),
+        "user_score": _latency_summary(score_samples),
+    }
+
+
+def bench_sqlite_helpers(env: PluginEnv, ops: int) -> Dict:
+    """测量 _record_game_start / _update_stats / _can_play 的吞吐。"""
+    plugin = env.plugin
+    results = {}
+    for name, call in (
+        ("record_game_start", lambda i: plugin._record_game_start(str(i % 1000), "bench")),
+        ("update_stats", lambda i: plugin._update_stats(str(i % 1000), "bench", 1, correct=bool(i % 2))),
+        ("can_play", lambda i: plugin._can_play(str(i % 1000))),
+    ):
+        t = time.perf_counter()
+        for i in range(ops):
+            call(i)
+        elapsed = time.perf_counter() - t
+        results[name] = {"ops": ops, "ops_per_sec": ops / elapsed if elapsed else 0.0}
+    return results
+
+
+async def run(args) -> Dict:
+    row_counts = [int(x) for x in args.rows.split(",") if x]
+    report: Dict = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "results": {},
+    }
+    with ResourceServer() as server:
+        env = PluginEnv(default_config(server.base_url))
+        try:
+            await env.ready()
+            report["meta"]["plugin_version"] = env.module.PLUGIN_VERSION
+            results = report["results"]
+            results["rounds"] = await bench_rounds(env, args.rounds)
+            results["options_image"] = await bench_options_image(env, args.repeats)
+            results["answers"] = await bench_answers(env, args.answers)
+            results["sqlite_helpers"] = bench_sqlite_helpers(env, args.sqlite_ops)
+            results["ranking"] = [await bench_ranking(env, rows, args.repeats) for rows in row_counts]
+            report["meta"]["resource_requests"] = server.hits
+        finally:
+            await env.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="猜卡插件基准测试")
+    parser.add_argument("--rounds", type=int, default=200, help="完整游戏轮数")
+    parser.add_argument("--answers", type=int, default=2000, help="单轮内提交的错误答案数")
+    parser.add_argument("--rows", default="10000,100000,1000000", help="排行榜测试的 user_stats 行数, 逗号分隔")
+    parser.add_argument("--repeats", type=int, default=5, help="排行榜/选项图的重复次数")
+    parser.add_argument("--sqlite-ops", type=int, default=2000, help="每个 SQLite 辅助方法的调用次数")
+    parser.add_argument("--output", help="结果 JSON 的输出路径, 默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
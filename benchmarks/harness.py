@@ -0,0 +1,428 @@
+"""
+猜卡插件基准测试 / 压测共用的运行环境。
+
+提供:
+- 一个最小化的 AstrBot 桩实现 (logger / filter / AstrMessageEvent / Context /
+  session_waiter / message_components), 通过 sys.modules 注入, 使 main.py
+  可以在没有 AstrBot 的环境下导入;
+- 一个运行在独立线程中的本地 HTTP 资源服务器, 模拟 remote_resource_url_base;
+- 合成 user_stats 数据的工具函数。
+
+基准脚本应在插件根目录下以模块方式运行, 例如:
+    python -m benchmarks.bench_plugin
+"""
+import asyncio
+import contextvars
+import importlib
+import io
+import logging
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PLUGIN_ROOT = Path(__file__).resolve().parent.parent
+PLUGIN_PACKAGE = "pjsk_guess_card"
+
+_DATA_DIR: Optional[Path] = None
+
+
+# --- AstrBot 桩实现 ---
+class FakeConfig(dict):
+    """模拟 AstrBotConfig, 本质上就是一个 dict。"""
+
+    def save_config(self):
+        pass
+
+
+class FakeContext:
+    pass
+
+
+class FakeResult:
+    """模拟 MessageEventResult, 记录插件产出的消息链。"""
+
+    def __init__(self, kind: str, chain: list):
+        self.kind = kind
+        self.chain = chain
+
+    def __repr__(self):
+        return f"FakeResult({self.kind}, {self.chain!r})"
+
+
+class FakeEvent:
+    """模拟 AstrMessageEvent。"""
+
+    def __init__(self, session_id: str, sender_id: str, sender_name: str, message: str,
+                 group_id: Optional[str] = None):
+        self.unified_msg_origin = session_id
+        self.message_str = message
+        self._sender_id = sender_id
+        self._sender_name = sender_name
+        self._group_id = group_id
+        self.sent: List[FakeResult] = []
+
+    def get_sender_id(self) -> str:
+        return self._sender_id
+
+    def get_sender_name(self) -> str:
+        return self._sender_name
+
+    def get_group_id(self) -> Optional[str]:
+        return self._group_id
+
+    def plain_result(self, text: str) -> FakeResult:
+        return FakeResult("plain", [text])
+
+    def chain_result(self, chain: list) -> FakeResult:
+        return FakeResult("chain", list(chain))
+
+    def image_result(self, path: str) -> FakeResult:
+        return FakeResult("image", [path])
+
+    async def send(self, result: FakeResult):
+        self.sent.append(result)
+
+
+class Plain:
+    def __init__(self, text: str):
+        self.text = text
+
+    def __repr__(self):
+        return f"Plain({self.text!r})"
+
+
+class Image:
+    def __init__(self, file: Optional[str] = None, **kwargs):
+        self.file = file
+
+    @staticmethod
+    def fromBytes(data: bytes, **kwargs) -> "Image":
+        img = Image(file="base64://")
+        img.raw = data
+        return img
+
+    def __repr__(self):
+        return f"Image({self.file!r})"
+
+
+class SessionController:
+    """模拟 AstrBot 的 SessionController, 只实现插件用到的 stop/keep。"""
+
+    def __init__(self, timeout: float):
+        self.stopped = False
+        self.deadline = time.monotonic() + timeout
+
+    def stop(self, error: Optional[Exception] = None):
+        self.stopped = True
+
+    def keep(self, timeout: float = 0, reset_timeout: bool = False):
+        if reset_timeout:
+            if timeout <= 0:
+                self.stop()
+                return
+            self.deadline = time.monotonic() + timeout
+        else:
+            self.deadline += timeout
+
+
+class SessionRouter:
+    """把后续消息按 unified_msg_origin 投递给正在等待的 session_waiter。"""
+
+    def __init__(self):
+        self.queues: Dict[str, asyncio.Queue] = {}
+
+    def queue_for(self, session_id: str) -> asyncio.Queue:
+        queue = self.queues.get(session_id)
+        if queue is None:
+            queue = self.queues[session_id] = asyncio.Queue()
+        return queue
+
+    def feed(self, event: FakeEvent):
+        self.queue_for(event.unified_msg_origin).put_nowait(event)
+
+    def is_waiting(self, session_id: str) -> bool:
+        return session_id in self.queues
+
+
+ROUTER = SessionRouter()
+
+
+def session_waiter(timeout: float = 30, record_history_chains: bool = False):
+    def decorator(handler):
+        async def wrapper(event: FakeEvent):
+            controller = SessionController(timeout)
+            queue = ROUTER.queue_for(event.unified_msg_origin)
+            try:
+                while not controller.stopped:
+                    remaining = controller.deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError()
+                    try:
+                        answer_event = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        raise TimeoutError()
+                    await handler(controller, answer_event)
+            finally:
+                ROUTER.queues.pop(event.unified_msg_origin, None)
+        return wrapper
+    return decorator
+
+
+class _Filter:
+    @staticmethod
+    def command(name: str, alias=None, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+
+class Star:
+    def __init__(self, context):
+        self.context = context
+
+
+def register(*args, **kwargs):
+    def decorator(cls):
+        return cls
+    return decorator
+
+
+class StarTools:
+    @staticmethod
+    def get_data_dir(plugin_name: str) -> Path:
+        assert _DATA_DIR is not None, "install_astrbot_stubs() 必须先于插件导入调用"
+        path = _DATA_DIR / plugin_name
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+
+def install_astrbot_stubs(data_dir: Path):
+    """把 AstrBot 的桩模块注册进 sys.modules。"""
+    global _DATA_DIR
+    _DATA_DIR = data_dir
+
+    def module(name: str, **attrs) -> types.ModuleType:
+        mod = sys.modules.get(name) or types.ModuleType(name)
+        for key, value in attrs.items():
+            setattr(mod, key, value)
+        sys.modules[name] = mod
+        return mod
+
+    logger = logging.getLogger("astrbot.stub")
+    module("astrbot")
+    module("astrbot.api", logger=logger, AstrBotConfig=FakeConfig)
+    module("astrbot.api.event", filter=_Filter(), AstrMessageEvent=FakeEvent)
+    module("astrbot.api.star", Context=FakeContext, Star=Star, register=register, StarTools=StarTools)
+    module("astrbot.api.message_components", Plain=Plain, Image=Image)
+    module("astrbot.core")
+    module("astrbot.core.utils")
+    module("astrbot.core.utils.session_waiter", session_waiter=session_waiter,
+           SessionController=SessionController)
+
+
+def import_plugin_module():
+    """以包的形式导入插件的 main.py, 以支持其中的相对导入。"""
+    if PLUGIN_PACKAGE not in sys.modules:
+        package = types.ModuleType(PLUGIN_PACKAGE)
+        package.__path__ = [str(PLUGIN_ROOT)]  # type: ignore[attr-defined]
+        sys.modules[PLUGIN_PACKAGE] = package
+    return importlib.import_module(f"{PLUGIN_PACKAGE}.main")
+
+
+# --- 本地资源服务器 ---
+class _ResourceHandler(BaseHTTPRequestHandler):
+    cache: Dict[str, bytes] = {}
+    cache_lock = threading.Lock()
+    hits = 0
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        path = self.path.lstrip("/")
+        if not path.endswith(".png"):
+            self.send_error(404)
+            return
+        with self.cache_lock:
+            type(self).hits += 1
+            data = self.cache.get(path)
+        if data is None:
+            data = _render_png(path)
+            with self.cache_lock:
+                self.cache[path] = data
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _render_png(path: str) -> bytes:
+    """按路径生成确定性的占位图片。缩略图与真实资源一样比 128px 稍大, 以覆盖缩放开销。"""
+    from PIL import Image as PILImage
+
+    if path.startswith("member_thumb/"):
+        size = (156, 156)
+    elif path.startswith("questions/"):
+        size = (400, 300)
+    else:
+        size = (1024, 576)
+    rnd = random.Random(path)
+    color = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256), 255)
+    img = PILImage.new("RGBA", size, color)
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+class ResourceServer:
+    """在后台线程中运行的 HTTP 资源服务器, 不占用被测插件的事件循环。"""
+
+    def __init__(self, latency: float = 0.0):
+        handler = type("Handler", (_ResourceHandler,), {"cache": {}, "hits": 0, "latency": latency})
+        self.handler = handler
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def hits(self) -> int:
+        return self.handler.hits
+
+    def __enter__(self) -> "ResourceServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def install_offline_emoji_source():
+    """让 Pilmoji 使用本地生成的表情图片, 避免排行榜渲染时访问 CDN 导致测量结果受网络影响。"""
+    from PIL import Image as PILImage
+    from pilmoji import Pilmoji
+    from pilmoji.source import BaseSource
+
+    buf = io.BytesIO()
+    PILImage.new("RGBA", (72, 72), (255, 200, 0, 255)).save(buf, "PNG")
+    emoji_png = buf.getvalue()
+
+    class OfflineEmojiSource(BaseSource):
+        def get_emoji(self, emoji: str, /):
+            return io.BytesIO(emoji_png)
+
+        def get_discord_emoji(self, id: int, /):
+            return None
+
+    Pilmoji.__init__.__kwdefaults__["source"] = OfflineEmojiSource
+
+
+# --- 插件构造与数据准备 ---
+def default_config(resource_url: str, **overrides) -> FakeConfig:
+    config = FakeConfig(
+        answer_timeout=30,
+        daily_play_limit=10 ** 9,
+        super_users=[],
+        group_whitelist=[],
+        game_cooldown_seconds=0,
+        max_guess_attempts=10 ** 9,
+        use_local_resources=False,
+        remote_resource_url_base=resource_url,
+    )
+    config.update(overrides)
+    return config
+
+
+CURRENT_SESSION: contextvars.ContextVar[str] = contextvars.ContextVar("CURRENT_SESSION", default="")
+
+
+class PluginEnv:
+    """持有一个插件实例及其临时数据目录。必须在运行中的事件循环里创建。
+
+    驱动代码在调用指令处理器前设置 CURRENT_SESSION, 即可通过 answer_for()
+    取得该会话当前一轮的正确答案。
+    """
+
+    def __init__(self, config: FakeConfig):
+        self.tmp = tempfile.TemporaryDirectory(prefix="guess_card_bench_")
+        tmp_path = Path(self.tmp.name)
+        install_astrbot_stubs(tmp_path / "data")
+        install_offline_emoji_source()
+        self.module = import_plugin_module()
+        self.context = FakeContext()
+        self.plugin = self.module.GuessCardPlugin(self.context, config)
+        # 把生成的选项图 / 排行榜重定向到临时目录, 避免污染插件目录
+        self.plugin.plugin_dir = tmp_path
+        self.router = ROUTER
+        self.answers: Dict[str, int] = {}
+
+        start_new_game = self.plugin.start_new_game
+
+        def recording_start_new_game(*args, **kwargs):
+            game_data = start_new_game(*args, **kwargs)
+            if game_data:
+                self.answers[CURRENT_SESSION.get()] = game_data["card"]["id"]
+            return game_data
+
+        self.plugin.start_new_game = recording_start_new_game
+
+    def answer_for(self, session_id: str) -> int:
+        return self.answers[session_id]
+
+    async def ready(self):
+        """等待插件的后台初始化 (卡牌目录、数据库) 完成"""
+        await self.plugin._wait_ready()
+
+    async def close(self):
+        await self.plugin.terminate()
+        self.tmp.cleanup()
+
+
+def seed_user_stats(db_path: str, rows: int, batch: int = 50_000, seed: int = 0):
+    """向 user_stats 写入 rows 行合成数据 (会先清空原有数据)。"""
+    rnd = random.Random(seed)
+    today = time.strftime("%Y-%m-%d")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM user_stats")
+        for start in range(0, rows, batch):
+            chunk = []
+            for i in range(start, min(start + batch, rows)):
+                attempts = rnd.randint(1, 500)
+                correct = rnd.randint(0, attempts)
+                chunk.append((str(10_000_000 + i), f"玩家{i}", correct * rnd.randint(1, 5),
+                              attempts, correct, today, rnd.randint(0, 10)))
+            conn.executemany(
+                "INSERT INTO user_stats (user_id, user_name, score, attempts, correct_attempts, last_play_date, daily_plays) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                chunk,
+            )
+        conn.commit()
+
+
+async def drain(agen) -> List[FakeResult]:
+    """完整消费一个指令处理器 (异步生成器) 并返回其全部输出。"""
+    return [result async for result in agen]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
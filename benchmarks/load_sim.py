@@ -0,0 +1,381 @@
+"""
+猜卡插件负载模拟器。
+
+在同一个事件循环中模拟 N 个群同时游戏: 每个群循环发起 `猜卡`, 在回合内按给定速率
+由 M 个用户提交数字答案 (一定比例为错误答案), 并穿插 `gcrank` / `猜卡分数` 查询。
+所有流量都经过插件真实的指令处理器。运行期间按固定间隔采样:
+
+- 事件循环延迟 (lag): 一个定时器任务的实际唤醒时间与预期时间之差;
+- 数据库争用: 所有经由 get_conn() 的 SQL 调用次数、耗时与 "database is locked" 次数;
+- 内存增长: tracemalloc 统计的 Python 堆以及进程 RSS。
+
+用法 (在插件根目录下):
+    python -m benchmarks.load_sim --groups 200 --users 30 --guess-rate 2 --wrong-ratio 0.9 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import sqlite3
+import time
+import tracemalloc
+from typing import Dict, List
+
+from benchmarks.harness import (
+    CURRENT_SESSION,
+    FakeEvent,
+    PluginEnv,
+    ResourceServer,
+    default_config,
+    drain,
+    percentile,
+    seed_user_stats,
+)
+
+
+# --- 数据库调用计量 ---
+class DBMeter:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.locked = 0
+        self.samples: List[float] = []
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.seconds += elapsed
+        self.samples.append(elapsed)
+
+    def snapshot_and_reset(self) -> Dict:
+        snap = {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "p99_ms": percentile(self.samples, 99) * 1000,
+            "max_ms": max(self.samples) * 1000 if self.samples else 0.0,
+            "locked_errors": self.locked,
+        }
+        self.calls, self.seconds, self.locked, self.samples = 0, 0.0, 0, []
+        return snap
+
+
+class _TimedCursor:
+    def __init__(self, cursor: sqlite3.Cursor, meter: DBMeter):
+        self._cursor = cursor
+        self._meter = meter
+
+    def _timed(self, func, *args):
+        t = time.perf_counter()
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e):
+                self._meter.locked += 1
+            raise
+        finally:
+            self._meter.record(time.perf_counter() - t)
+
+    def execute(self, *args):
+        self._timed(self._cursor.execute, *args)
+        return self
+
+    def executemany(self, *args):
+        self._timed(self._cursor.executemany, *args)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, *args):
+        return self._cursor.fetchmany(*args)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _TimedConnection:
+    def __init__(self, conn: sqlite3.Connection, meter: DBMeter):
+        self._conn = conn
+        self._meter = meter
+
+    def cursor(self):
+        return _TimedCursor(self._conn.cursor(), self._meter)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        t = time.perf_counter()
+        try:
+            self._conn.commit()
+        finally:
+            self._meter.record(time.perf_counter() - t)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrument_db(plugin, meter: DBMeter):
+    get_conn = plugin.get_conn
+
+    def timed_get_conn(*args, **kwargs):
+        return _TimedConnection(get_conn(*args, **kwargs), meter)
+
+    plugin.get_conn = timed_get_conn
+
+
+# --- 事件循环延迟采样 ---
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def snapshot_and_reset(self) -> Dict:
+        snap = {
+            "p50_ms": percentile(self.samples, 50) * 1000,
+            "p99_ms": percentile(self.samples, 99) * 1000,
+            "max_ms": max(self.samples) * 1000 if self.samples else 0.0,
+        }
+        self.samples = []
+        return snap
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # 非 Linux 平台退化为峰值 RSS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# --- 流量模型 ---
+class Counters:
+    def __init__(self):
+        self.rounds_started = 0
+        self.rounds_finished = 0
+        self.rounds_failed = 0
+        self.guesses = 0
+        self.queries = 0
+        self.errors = 0
+
+    def as_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+
+async def group_player(env: PluginEnv, args, group_idx: int, counters: Counters, stop_at: float):
+    """单个群的游戏循环: 开局 -> 按速率猜测 -> 结束后稍作停顿再开下一局。"""
+    rnd = random.Random(args.seed * 100003 + group_idx)
+    plugin = env.plugin
+    group_id = f"g{group_idx}"
+    session_id = f"sim:group:{group_id}"
+    users = [(f"{group_idx * 10_000 + u}", f"用户{group_idx}-{u}") for u in range(args.users)]
+    CURRENT_SESSION.set(session_id)
+    loop = asyncio.get_running_loop()
+
+    while loop.time() < stop_at:
+        starter_id, starter_name = rnd.choice(users)
+        event = FakeEvent(session_id, starter_id, starter_name, "猜卡", group_id=group_id)
+        handler = plugin.start_guess_card(event)
+        try:
+            first = await handler.__anext__()
+        except StopAsyncIteration:
+            counters.rounds_failed += 1
+            await asyncio.sleep(args.think_time)
+            continue
+        if first.kind != "chain" or session_id not in env.answers:
+            counters.rounds_failed += 1
+            await drain(handler)
+            await asyncio.sleep(args.think_time)
+            continue
+        counters.rounds_started += 1
+
+        drain_task = asyncio.create_task(drain(handler))
+        correct_id = env.answer_for(session_id)
+        while not drain_task.done() and loop.time() < stop_at:
+            await asyncio.sleep(rnd.expovariate(args.guess_rate))
+            if drain_task.done():
+                break
+            if not env.router.is_waiting(session_id):
+                continue
+            user_id, user_name = rnd.choice(users)
+            guess = correct_id if rnd.random() >= args.wrong_ratio else correct_id + rnd.randint(1, 5000)
+            env.router.feed(FakeEvent(session_id, user_id, user_name, str(guess), group_id=group_id))
+            counters.guesses += 1
+
+        # 模拟结束时用一次正确回答让本轮收尾, 不等待 answer_timeout
+        while not drain_task.done():
+            if env.router.is_waiting(session_id):
+                env.router.feed(FakeEvent(session_id, users[0][0], users[0][1], str(correct_id), group_id=group_id))
+                break
+            await asyncio.sleep(0.01)
+        try:
+            await drain_task
+            counters.rounds_finished += 1
+        except Exception:
+            counters.errors += 1
+        env.answers.pop(session_id, None)
+        await asyncio.sleep(args.think_time)
+
+
+async def group_querier(env: PluginEnv, args, group_idx: int, counters: Counters, stop_at: float):
+    """按速率在群内发送排行榜 / 个人分数查询。"""
+    if args.query_rate <= 0:
+        return
+    rnd = random.Random(args.seed * 200003 + group_idx)
+    plugin = env.plugin
+    group_id = f"g{group_idx}"
+    loop = asyncio.get_running_loop()
+    while True:
+        delay = rnd.expovariate(args.query_rate)
+        if loop.time() + delay >= stop_at:
+            return
+        await asyncio.sleep(delay)
+        user_id = f"{group_idx * 10_000 + rnd.randrange(args.users)}"
+        if rnd.random() < 0.5:
+            event = FakeEvent(f"sim:group:{group_id}", user_id, "查询者", "gcrank", group_id=group_id)
+            handler = plugin.show_ranking(event)
+        else:
+            event = FakeEvent(f"sim:group:{group_id}", user_id, "查询者", "猜卡分数", group_id=group_id)
+            handler = plugin.show_user_score(event)
+        try:
+            await drain(handler)
+            counters.queries += 1
+        except Exception:
+            counters.errors += 1
+
+
+async def sampler(env: PluginEnv, args, counters: Counters, meter: DBMeter, lag: LoopLagMonitor,
+                  timeline: List[Dict], stop_at: float):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    baseline_heap = tracemalloc.get_traced_memory()[0]
+    while loop.time() < stop_at:
+        await asyncio.sleep(args.sample_interval)
+        heap, heap_peak = tracemalloc.get_traced_memory()
+        timeline.append({
+            "t": round(loop.time() - start, 3),
+            "counters": counters.as_dict(),
+            "active_sessions": len(env.context.active_game_sessions),
+            "loop_lag": lag.snapshot_and_reset(),
+            "db": meter.snapshot_and_reset(),
+            "memory": {
+                "heap_bytes": heap,
+                "heap_growth_bytes": heap - baseline_heap,
+                "heap_peak_bytes": heap_peak,
+                "rss_bytes": _rss_bytes(),
+            },
+        })
+
+
+async def run(args) -> Dict:
+    tracemalloc.start()
+    timeline: List[Dict] = []
+    counters = Counters()
+    meter = DBMeter()
+    lag = LoopLagMonitor()
+
+    with ResourceServer(latency=args.resource_latency) as server:
+        config = default_config(
+            server.base_url,
+            answer_timeout=args.answer_timeout,
+            max_guess_attempts=args.max_guess_attempts,
+        )
+        env = PluginEnv(config)
+        try:
+            await env.ready()
+            if args.seed_rows:
+                seed_user_stats(env.plugin.db_path, args.seed_rows)
+            instrument_db(env.plugin, meter)
+
+            loop = asyncio.get_running_loop()
+            stop_at = loop.time() + args.duration
+            lag.start()
+            tasks = [asyncio.create_task(sampler(env, args, counters, meter, lag, timeline, stop_at))]
+            for g in range(args.groups):
+                tasks.append(asyncio.create_task(group_player(env, args, g, counters, stop_at)))
+                tasks.append(asyncio.create_task(group_querier(env, args, g, counters, stop_at)))
+            await asyncio.gather(*tasks)
+            lag.stop()
+            resource_requests = server.hits
+        finally:
+            await env.close()
+            tracemalloc.stop()
+
+    lag_p99 = [s["loop_lag"]["p99_ms"] for s in timeline]
+    return {
+        "params": vars(args),
+        "summary": {
+            "counters": counters.as_dict(),
+            "rounds_per_sec": counters.rounds_finished / args.duration,
+            "guesses_per_sec": counters.guesses / args.duration,
+            "worst_loop_lag_p99_ms": max(lag_p99) if lag_p99 else 0.0,
+            "db_seconds_total": sum(s["db"]["seconds"] for s in timeline),
+            "db_locked_errors": sum(s["db"]["locked_errors"] for s in timeline),
+            "heap_growth_bytes": timeline[-1]["memory"]["heap_growth_bytes"] if timeline else 0,
+            "resource_requests": resource_requests,
+        },
+        "timeline": timeline,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="猜卡插件负载模拟")
+    parser.add_argument("--groups", type=int, default=100, help="同时游戏的群数量 N")
+    parser.add_argument("--users", type=int, default=20, help="每个群的活跃用户数 M")
+    parser.add_argument("--guess-rate", type=float, default=1.0, help="每个群每秒的猜测次数 (泊松到达)")
+    parser.add_argument("--wrong-ratio", type=float, default=0.9, help="猜测中错误答案的比例")
+    parser.add_argument("--query-rate", type=float, default=0.05, help="每个群每秒的 gcrank/猜卡分数 查询次数")
+    parser.add_argument("--think-time", type=float, default=1.0, help="一局结束到下一局开始之间的间隔 (秒)")
+    parser.add_argument("--duration", type=float, default=30.0, help="模拟时长 (秒)")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="采样间隔 (秒)")
+    parser.add_argument("--answer-timeout", type=int, default=60, help="插件配置 answer_timeout")
+    parser.add_argument("--max-guess-attempts", type=int, default=10, help="插件配置 max_guess_attempts")
+    parser.add_argument("--resource-latency", type=float, default=0.0, help="模拟资源服务器的响应延迟 (秒)")
+    parser.add_argument("--seed-rows", type=int, default=10_000, help="预先写入的 user_stats 行数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", help="结果 JSON 的输出路径, 默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
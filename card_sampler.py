@@ -0,0 +1,140 @@
+"""
+抽卡用的采样工具。
+
+- AliasTable: Vose 别名法, O(n) 建表, O(1) 按权重抽样;
+- RecentHistory: 固定容量的环形缓冲区 + 集合, O(1) 记录与判断最近出现过的卡牌;
+- CardSampler: 在一个卡池上等概率抽卡, 并避开会话最近出过的卡牌, 每次抽卡 O(K)。
+
+卡池在加载卡牌数据时按角色预先建好, 每次抽卡的开销与卡池如何按角色过滤无关。
+"""
+import random
+from typing import Dict, Generic, Hashable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class AliasTable:
+    """按权重进行 O(1) 抽样的别名表"""
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        if n == 0:
+            raise ValueError("权重列表不能为空")
+        total = float(sum(weights))
+        if total <= 0 or any(w < 0 for w in weights):
+            raise ValueError("权重必须非负且总和大于 0")
+
+        self.n = n
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # 剩余项的概率因浮点误差应视为 1
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def sample(self, rng: random.Random = random) -> int:  # type: ignore[assignment]
+        u = rng.random() * self.n
+        i = int(u)
+        return i if (u - i) < self.prob[i] else self.alias[i]
+
+
+class RecentHistory(Generic[T]):
+    """记录最近 capacity 个元素, 新元素加入时淘汰最旧的元素. 内存占用只与 capacity 有关"""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(0, capacity)
+        self._ring: List[Optional[T]] = [None] * self.capacity
+        self._head = 0
+        self._count = 0
+        self._members: Dict[T, int] = {}  # 元素 -> 在环中出现的次数
+
+    def __contains__(self, item: T) -> bool:
+        return item in self._members
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[T]:
+        """遍历历史中的不同元素 (不含重复)"""
+        return iter(self._members)
+
+    def add(self, item: T):
+        if self.capacity == 0:
+            return
+        if self._count == self.capacity:
+            old = self._ring[self._head]
+            remaining = self._members[old] - 1  # type: ignore[index]
+            if remaining:
+                self._members[old] = remaining  # type: ignore[index]
+            else:
+                del self._members[old]  # type: ignore[arg-type]
+        else:
+            self._count += 1
+        self._ring[self._head] = item
+        self._members[item] = self._members.get(item, 0) + 1
+        self._head = (self._head + 1) % self.capacity
+
+
+class CardSampler:
+    """
+    在固定卡池上等概率抽卡.
+    传入会话的 RecentHistory 时只在不属于该历史的卡牌中抽取: 先把历史中的卡牌逐个交换到
+    共享数组的末尾, 在前面剩下的部分中均匀抽取, 再按相反顺序撤销这些交换.
+    每次抽卡 O(K) (K 为历史窗口大小), 与卡池大小无关, 会话本身只保存 K 个ID.
+    历史覆盖了整个卡池 (卡池很小的情况) 时允许重复.
+    """
+
+    def __init__(self, cards: Sequence[Dict], key: str = "id"):
+        if not cards:
+            raise ValueError("卡池不能为空")
+        self.cards = list(cards)
+        self.key = key
+        self._pos: Dict[Hashable, int] = {card[key]: i for i, card in enumerate(self.cards)}
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def _swap(self, i: int, j: int):
+        cards, pos = self.cards, self._pos
+        cards[i], cards[j] = cards[j], cards[i]
+        pos[cards[i][self.key]] = i
+        pos[cards[j][self.key]] = j
+
+    def sample(self, exclude: Optional[RecentHistory] = None, rng: random.Random = random) -> Dict:  # type: ignore[assignment]
+        if exclude is None or not len(exclude):
+            return self.cards[rng.randrange(len(self.cards))]
+
+        end = len(self.cards)
+        swaps: List[Tuple[int, int]] = []
+        for item in exclude:
+            i = self._pos.get(item)
+            if i is None or i >= end:  # 不在本卡池中
+                continue
+            end -= 1
+            if i != end:
+                self._swap(i, end)
+                swaps.append((i, end))
+        card = self.cards[rng.randrange(end if end else len(self.cards))]
+        for i, j in reversed(swaps):
+            self._swap(i, j)
+        return card
+
+
+def build_character_samplers(cards: Sequence[Dict]) -> Dict[Optional[Hashable], CardSampler]:
+    """为全部卡牌 (键为 None) 和每个角色分别建立采样器"""
+    by_character: Dict[Hashable, List[Dict]] = {}
+    for card in cards:
+        by_character.setdefault(card["characterId"], []).append(card)
+    samplers: Dict[Optional[Hashable], CardSampler] = {None: CardSampler(cards)}
+    for character_id, pool in by_character.items():
+        samplers[character_id] = CardSampler(pool)
+    return samplers
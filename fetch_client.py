@@ -0,0 +1,274 @@
+"""
+远程资源获取客户端。
+
+- 共享一个调优过的 aiohttp 连接池 (总连接数 / 单主机连接数上限、keep-alive、DNS 缓存);
+- 全局与单次请求超时, 对幂等 GET 进行带抖动的指数退避重试;
+- 按主机划分的熔断器: 上游连续失败时快速失败, 由调用方回退到本地或缓存资源;
+- 统计信标等"发出即忘"的请求会被跟踪并限制并发数量, 不会在上游卡死时无限堆积;
+- SingleFlight: 合并对同一资源的并发请求, 只执行一次下载/解码。
+
+aiohttp 在首次发起请求时才导入, 以免拖慢插件加载。
+"""
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Hashable, Optional, Set, TypeVar
+from urllib.parse import urlparse
+
+from astrbot.api import logger
+
+if TYPE_CHECKING:
+    import aiohttp
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态, 请求被直接拒绝。"""
+
+
+class UpstreamStatusError(Exception):
+    """上游返回了非 2xx 状态码。"""
+
+    def __init__(self, url: str, status: int):
+        super().__init__(f"{url} 返回状态码 {status}")
+        self.url = url
+        self.status = status
+
+
+class CircuitBreaker:
+    """
+    简单的三态熔断器.
+    - closed: 正常放行, 连续失败达到阈值后打开;
+    - open: 直接拒绝, 经过 reset_timeout 秒后进入 half-open;
+    - half-open: 只放行一个试探请求, 成功则关闭, 失败则重新打开.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def release(self):
+        """请求被取消时归还 half-open 的试探名额, 不计成功或失败。"""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self._failures += 1
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+class FetchClient:
+    """插件共用的 HTTP 客户端, 延迟创建连接池。"""
+
+    RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        total_timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.3,
+        limit: int = 100,
+        limit_per_host: int = 16,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_pending_pings: int = 8,
+        stale_cache_bytes: int = 16 * 1024 * 1024,
+        stale_entry_max_bytes: int = 256 * 1024,
+    ):
+        self.total_timeout = total_timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._connector_kwargs = dict(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=dns_cache_ttl,
+        )
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._pending_pings: Set[asyncio.Task] = set()
+        self.max_pending_pings = max_pending_pings
+        # 最近成功获取的内容, 仅在上游失败时作为回退使用; 按总字节数淘汰。
+        # 大于 stale_entry_max_bytes 的内容 (题目/答案原图) 不缓存, 它们已有磁盘上的 image_cache
+        self._stale_cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._stale_cache_bytes = stale_cache_bytes
+        self._stale_entry_max_bytes = min(stale_entry_max_bytes, stale_cache_bytes)
+        self._stale_cache_used = 0
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(**self._connector_kwargs)
+            timeout = aiohttp.ClientTimeout(total=self.total_timeout, connect=self.connect_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    def breaker_for(self, url: str) -> CircuitBreaker:
+        host = urlparse(url).netloc
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(self._failure_threshold, self._reset_timeout)
+        return breaker
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: 在 [0, base * 2^attempt] 内随机, 避免多个请求同时重试
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    def _remember(self, url: str, data: bytes):
+        old = self._stale_cache.pop(url, None)
+        if old is not None:
+            self._stale_cache_used -= len(old)
+        if len(data) > self._stale_entry_max_bytes:
+            return
+        self._stale_cache[url] = data
+        self._stale_cache_used += len(data)
+        while self._stale_cache_used > self._stale_cache_bytes:
+            _, evicted = self._stale_cache.popitem(last=False)
+            self._stale_cache_used -= len(evicted)
+
+    async def get_bytes(self, url: str, timeout: Optional[float] = None, retries: Optional[int] = None) -> bytes:
+        """
+        GET 一个资源并返回其内容.
+        连接错误、超时和 429/5xx 会按退避策略重试; 其他 4xx 直接抛出.
+        上游不可用 (熔断或重试耗尽) 时, 若该 URL 曾成功获取过, 则返回上次的内容.
+        """
+        import aiohttp
+
+        try:
+            data = await self._get_with_retries(url, timeout, retries)
+        except (CircuitOpenError, aiohttp.ClientError, asyncio.TimeoutError, UpstreamStatusError) as e:
+            stale = self._stale_cache.get(url)
+            if stale is None or (isinstance(e, UpstreamStatusError) and e.status not in self.RETRYABLE_STATUS):
+                raise
+            logger.warning(f"获取 {url} 失败 ({e!r}), 使用缓存内容。")
+            return stale
+        self._remember(url, data)
+        return data
+
+    async def _get_with_retries(self, url: str, timeout: Optional[float], retries: Optional[int]) -> bytes:
+        import aiohttp
+
+        breaker = self.breaker_for(url)
+        max_retries = self.max_retries if retries is None else retries
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+        session = self._get_session()
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"{urlparse(url).netloc} 的熔断器已打开")
+            try:
+                async with session.get(url, timeout=request_timeout) as response:
+                    if response.status >= 400:
+                        raise UpstreamStatusError(url, response.status)
+                    data = await response.read()
+                breaker.record_success()
+                return data
+            except UpstreamStatusError as e:
+                if e.status not in self.RETRYABLE_STATUS:
+                    # 上游可达, 只是资源不存在等客户端错误, 不计入熔断
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if attempt >= max_retries:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                breaker.record_failure()
+                if attempt >= max_retries:
+                    raise
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def send_ping(self, url: str, timeout: float = 2.0):
+        """
+        发出一个不关心结果的 GET 请求 (例如统计信标).
+        请求在后台进行并被跟踪; 待处理的请求过多或熔断器打开时直接丢弃.
+        """
+        if len(self._pending_pings) >= self.max_pending_pings:
+            return
+        if self.breaker_for(url).state == "open":
+            return
+        task = asyncio.create_task(self._ping(url, timeout))
+        self._pending_pings.add(task)
+        task.add_done_callback(self._pending_pings.discard)
+
+    async def _ping(self, url: str, timeout: float):
+        try:
+            await self._get_with_retries(url, timeout, retries=0)
+        except Exception as e:
+            logger.warning(f"Stats ping to {url} failed: {e!r}")
+
+    async def close(self):
+        for task in list(self._pending_pings):
+            task.cancel()
+        if self._pending_pings:
+            await asyncio.gather(*self._pending_pings, return_exceptions=True)
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+
+class SingleFlight:
+    """
+    合并同一 key 的并发调用: 第一个调用者启动任务, 之后的调用者等待同一个任务的结果.
+    任务完成 (无论成功或失败) 后立即移除, 不缓存任何结果; 异常会传递给所有等待者.
+    任务在独立的 Task 中运行, 单个等待者被取消不会影响其他等待者.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Task"] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: "asyncio.Task"):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有等待者都已被取消时, 标记异常为已读取, 避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
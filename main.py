@@ -6,24 +6,28 @@ import time
 import os
 import sqlite3
 import io
-from typing import List, Dict, Optional, Tuple, Union
+import importlib.util
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple, Union
 from pathlib import Path
-from jinja2 import Template
-from PIL import Image, ImageDraw, ImageFont
-from datetime import datetime
-from pilmoji import Pilmoji
+from datetime import datetime, timedelta
 from urllib.error import URLError
 from urllib.parse import urlparse
-import aiohttp
 
+# Pillow / pilmoji / aiohttp 导入较慢，只在首次绘图或请求时才导入，加快插件加载与重载
+if TYPE_CHECKING:
+    from PIL import Image
 
-try:
-    # 兼容Pillow >= 9.1.0, 使用 Resampling 枚举
-    from PIL.Image import Resampling
-    LANCZOS = Resampling.LANCZOS
-except ImportError:
-    # 兼容Pillow < 9.1.0, ANTIALIAS 的值为 1，直接使用该值以绕过linter
-    LANCZOS = 1
+
+def get_lanczos():
+    """返回 LANCZOS 重采样常量 (首次调用时导入 Pillow)"""
+    try:
+        # 兼容Pillow >= 9.1.0, 使用 Resampling 枚举
+        from PIL.Image import Resampling
+        return Resampling.LANCZOS
+    except ImportError:
+        # 兼容Pillow < 9.1.0, ANTIALIAS 的值为 1，直接使用该值以绕过linter
+        return 1
 
 # AstrBot's recommended logger. If this fails, the environment is likely misconfigured.
 
@@ -51,6 +55,13 @@ except ImportError:
             # This path is relative to the directory containing the 'plugins' folder
             return Path(__file__).parent.parent.parent.parent / 'data' / 'plugins_data' / plugin_name
 
+from .fetch_client import FetchClient, CircuitOpenError, SingleFlight
+from .round_history import RoundHistoryWriter, RoundRecord
+from .asset_pack import ASSET_PACK_NAME, AssetPack, AssetPackError
+from .card_sampler import AliasTable, RecentHistory, build_character_samplers
+from . import stats_io
+from .settings import PluginSettings
+
 
 # --- 插件元数据 ---
 PLUGIN_NAME = "pjsk_guess_card"
@@ -59,6 +70,59 @@ PLUGIN_DESCRIPTION = "PJSK猜卡插件"
 PLUGIN_VERSION = "1.1.1" # 版本升级
 PLUGIN_REPO_URL = "https://github.com/nichinichisou0609/astrbot_plugin_pjsk_guess_card"
 
+DIFFICULTIES = ["easy", "normal", "hard"]
+
+
+def build_difficulty_table(weights) -> AliasTable:
+    """根据配置的难度权重 (依次为 easy/normal/hard) 建立抽样表，配置无效时使用均匀权重"""
+    try:
+        parsed = [float(w) for w in weights]
+        if len(parsed) != len(DIFFICULTIES):
+            raise ValueError(f"需要 {len(DIFFICULTIES)} 个权重")
+        return AliasTable(parsed)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"难度权重配置 {weights!r} 无效 ({e})，将使用均匀权重。")
+        return AliasTable([1] * len(DIFFICULTIES))
+
+
+# --- 连续模式 ---
+# `猜卡 连续 [轮数] [角色名]`，未指定轮数时使用默认值，上限由 marathon_max_rounds 配置
+MARATHON_PATTERN = re.compile(r"^(?:连续|marathon)\s*(\d+)?\s*(.*)$", re.IGNORECASE)
+DEFAULT_MARATHON_ROUNDS = 10
+MAX_RECENT_SESSIONS = 4096 # 最多为多少个会话保留最近出题记录，超出时淘汰最久未出题的会话
+
+
+# --- 时间窗口排行榜 ---
+# 窗口类型 -> 显示名称
+RANKING_WINDOWS = {"day": "今日", "week": "本周", "month": "本月"}
+# 指令参数 -> 窗口类型
+RANKING_WINDOW_ALIASES = {
+    "日": "day", "今日": "day", "day": "day", "daily": "day",
+    "周": "week", "本周": "week", "week": "week", "weekly": "week",
+    "月": "month", "本月": "month", "month": "month", "monthly": "month",
+}
+
+
+def get_window_periods(now: Optional[datetime] = None) -> Dict[str, str]:
+    """返回各时间窗口当前所处的周期标识，字符串按字典序与时间顺序一致"""
+    now = now or datetime.now()
+    iso_year, iso_week, _ = now.isocalendar()
+    return {
+        "day": now.strftime("%Y-%m-%d"),
+        "week": f"{iso_year}-W{iso_week:02d}",
+        "month": now.strftime("%Y-%m"),
+    }
+
+
+def get_previous_window_periods(now: Optional[datetime] = None) -> Dict[str, str]:
+    """返回各时间窗口上一个周期的标识"""
+    now = now or datetime.now()
+    return {
+        "day": get_window_periods(now - timedelta(days=1))["day"],
+        "week": get_window_periods(now - timedelta(weeks=1))["week"],
+        "month": get_window_periods(now.replace(day=1) - timedelta(days=1))["month"],
+    }
+
 
 # --- 数据库管理 ---
 def get_db_path(context: Context, plugin_dir: Path) -> str:
@@ -85,6 +149,88 @@ def init_db(db_path: str):
             )
             """
         )
+        # 按群统计的分数表。排名索引覆盖了排行榜需要的所有列，
+        # 群排行榜和群内排名都只需在索引上做一次范围扫描，与群的总数无关。
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS group_user_stats (
+                group_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                user_name TEXT,
+                score INTEGER DEFAULT 0,
+                attempts INTEGER DEFAULT 0,
+                correct_attempts INTEGER DEFAULT 0,
+                PRIMARY KEY (group_id, user_id)
+            ) WITHOUT ROWID
+            """
+        )
+        cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_group_user_stats_rank
+            ON group_user_stats (group_id, score DESC, user_id, user_name, attempts, correct_attempts)
+            """
+        )
+        # 日/周/月排行榜的增量汇总表。group_id 为空字符串表示全服榜。
+        # 过期周期由后台任务清理，查询时只读取当前周期。
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS windowed_user_stats (
+                window_type TEXT NOT NULL,
+                period TEXT NOT NULL,
+                group_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                user_name TEXT,
+                score INTEGER DEFAULT 0,
+                attempts INTEGER DEFAULT 0,
+                correct_attempts INTEGER DEFAULT 0,
+                PRIMARY KEY (window_type, period, group_id, user_id)
+            ) WITHOUT ROWID
+            """
+        )
+        cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_windowed_user_stats_rank
+            ON windowed_user_stats (window_type, period, group_id, score DESC, user_id, user_name, attempts, correct_attempts)
+            """
+        )
+        # 对局历史明细 (仅追加)，由 RoundHistoryWriter 批量写入
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS game_rounds (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT,
+                group_id TEXT,
+                card_id INTEGER,
+                character_id INTEGER,
+                difficulty TEXT,
+                card_state TEXT,
+                show_rarity_hint INTEGER,
+                show_training_hint INTEGER,
+                winner_id TEXT,
+                attempts INTEGER,
+                outcome TEXT,
+                started_at REAL,
+                duration REAL
+            )
+            """
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_game_rounds_started_at ON game_rounds (started_at)")
+        # 超过保留期的明细按天汇总到这里
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS game_rounds_daily (
+                day TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                show_rarity_hint INTEGER NOT NULL,
+                show_training_hint INTEGER NOT NULL,
+                rounds INTEGER DEFAULT 0,
+                solved_rounds INTEGER DEFAULT 0,
+                total_attempts INTEGER DEFAULT 0,
+                total_duration REAL DEFAULT 0,
+                PRIMARY KEY (day, difficulty, show_rarity_hint, show_training_hint)
+            )
+            """
+        )
         conn.commit()
 
 
@@ -158,138 +304,269 @@ class GuessCardPlugin(Star):  # type: ignore
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
         self.config = config
+        self.settings = PluginSettings.from_config(config) # 不可变的配置快照，配置变更时整体替换
         self.plugin_dir = Path(os.path.dirname(__file__))
         self.resources_dir = self.plugin_dir / "resources"
         self.db_path = get_db_path(context, self.plugin_dir)
-        init_db(self.db_path)
-        self.guess_cards, self.characters_map = load_card_data(self.resources_dir)
+        self.image_cache_dir = StarTools.get_data_dir(PLUGIN_NAME) / "image_cache" # 远程模式下题目/答案图片的本地缓存
+        self.export_dir = StarTools.get_data_dir(PLUGIN_NAME) / "exports" # 玩家统计的导出文件
+        self._stats_io_lock = asyncio.Lock() # 同一时间只允许一个导出或导入
         self.last_game_end_time = {} # 存储每个会话的最后游戏结束时间
-        self.http_session = None
-
-        # 新增：创建角色名到ID的映射
-        self.character_name_to_id_map = {
-            char['name'].lower(): char_id for char_id, char in self.characters_map.items()
-        } if self.characters_map else {}
+        self.fetch_client = FetchClient(
+            total_timeout=self.settings.remote_timeout_seconds,
+            max_retries=self.settings.remote_max_retries,
+        )
+        self._image_flight = SingleFlight() # 合并同一资源的并发下载与解码
+        self.recent_cards: "OrderedDict[str, RecentHistory]" = OrderedDict() # 每个会话最近出过的卡牌ID，按最近出题时间排序
+
+        # 以下数据由 _initialize 在后台加载，指令处理前需等待 _wait_ready()
+        self.guess_cards: Optional[List[Dict]] = None
+        self.characters_map: Optional[Dict] = None
+        self.character_name_to_id_map: Dict[str, int] = {}
+        self.card_samplers = {}
+        self.cards_by_character: Dict[int, List[Dict]] = {}
+        self.difficulty_table: Optional[AliasTable] = None
+        self.asset_pack: Optional[AssetPack] = None # 本地模式下的单文件资源包
+        self._ready = asyncio.Event()
 
         # 使用 context 初始化共享的游戏会话状态
         if not hasattr(self.context, "active_game_sessions"):
             self.context.active_game_sessions = set()
 
-        if not self.guess_cards or not self.characters_map:
-            logger.error("插件初始化失败，缺少必要的卡牌数据文件。插件功能将受限。")
-        
-        if not aiohttp:
+        if importlib.util.find_spec("aiohttp") is None:
             logger.warning("`aiohttp` 模块未安装，远程图片功能将受限或性能较差。建议安装: pip install aiohttp")
 
         # --- 新增：初始化后台任务句柄 ---
         self._cleanup_task = None
+        self._init_task = asyncio.create_task(self._initialize())
 
-        # 启动时清理一次旧图片
-        self._cleanup_output_dir()
         # --- 新增：启动周期性清理任务 ---
         self._cleanup_task = asyncio.create_task(self._periodic_cleanup_task())
+        # 对局历史在后台批量写入
+        self.round_history = RoundHistoryWriter(self.db_path)
+        self.round_history.start()
 
-    async def _get_session(self) -> Optional['aiohttp.ClientSession']:
-        """延迟初始化并获取 aiohttp session"""
-        if not aiohttp:
-            return None
-        if self.http_session is None or self.http_session.closed:
-            self.http_session = aiohttp.ClientSession()
-        return self.http_session
+    async def _initialize(self):
+        """在线程中初始化数据库、加载卡牌数据并清理旧图片，完成后唤醒等待中的指令。"""
+        try:
+            await asyncio.to_thread(self._load_catalogue)
+        except Exception as e:
+            logger.error(f"猜卡插件初始化失败: {e}", exc_info=True)
+        finally:
+            self._ready.set()
 
-    async def _send_stats_ping(self, game_type: str):
-        """(已重构) 向专用统计服务器的5000端口发送GET请求。"""
-        if self.config.get("use_local_resources", True):
+    def _load_catalogue(self):
+        init_db(self.db_path)
+        guess_cards, characters_map = load_card_data(self.resources_dir)
+        if not guess_cards or not characters_map:
+            logger.error("插件初始化失败，缺少必要的卡牌数据文件。插件功能将受限。")
+
+        # 新增：创建角色名到ID的映射
+        self.character_name_to_id_map = {
+            char['name'].lower(): char_id for char_id, char in characters_map.items()
+        } if characters_map else {}
+
+        # 按角色预建卡池与采样器，每轮抽卡为 O(1)
+        self.card_samplers = build_character_samplers(guess_cards) if guess_cards else {}
+        self.cards_by_character = {
+            char_id: sampler.cards for char_id, sampler in self.card_samplers.items() if char_id is not None
+        }
+        self.difficulty_table = build_difficulty_table(self.settings.difficulty_weights)
+        self.asset_pack = self._open_asset_pack()
+        self.guess_cards, self.characters_map = guess_cards, characters_map
+
+        # 启动时清理一次旧图片
+        self._cleanup_output_dir()
+
+    async def _wait_ready(self):
+        """等待后台初始化完成。初始化失败时同样会返回，由各指令按数据缺失处理。"""
+        await self._ready.wait()
+
+    def _send_stats_ping(self, game_type: str):
+        """(已重构) 向专用统计服务器的5000端口发送GET请求。请求在后台进行，由 fetch_client 跟踪并限流。"""
+        if self.settings.use_local_resources:
             return
 
-        resource_url_base = self.config.get("remote_resource_url_base", "")
+        resource_url_base = self.settings.remote_resource_url_base
         if not resource_url_base:
             return
 
-        try:
-            session = await self._get_session()
-            if not session:
-                logger.warning("aiohttp not installed, cannot send stats ping.")
-                return
+        # 从资源URL中提取协议和主机名，然后强制使用5000端口
+        parsed_url = urlparse(resource_url_base)
+        stats_server_root = f"{parsed_url.scheme}://{parsed_url.hostname}:5000"
 
-            # 从资源URL中提取协议和主机名，然后强制使用5000端口
-            parsed_url = urlparse(resource_url_base)
-            stats_server_root = f"{parsed_url.scheme}://{parsed_url.hostname}:5000"
-            
-            # 构建最终的统计请求URL
-            ping_url = f"{stats_server_root}/stats_ping/{game_type}.ping"
-
-            # 异步发送请求
-            async with session.get(ping_url, timeout=2):
-                pass  # We just need the request to be made.
-        except Exception as e:
-            logger.warning(f"Stats ping to {ping_url} failed: {e}")
+        # 构建最终的统计请求URL
+        ping_url = f"{stats_server_root}/stats_ping/{game_type}.ping"
+        self.fetch_client.send_ping(ping_url, timeout=2)
 
     async def _periodic_cleanup_task(self):
         """每隔一小时自动清理一次 output 目录。"""
         cleanup_interval_seconds = 3600 # 1 hour
+        await self._wait_ready()
         while True:
             await asyncio.sleep(cleanup_interval_seconds)
             logger.info("开始周期性清理 guess_card output 目录...")
             try:
                 # 猜卡插件的清理任务IO不多，可以直接运行
                 self._cleanup_output_dir()
+                self._cleanup_image_cache()
+                # 日/周/月汇总表较大，删除过期周期放到线程中执行，不阻塞事件循环
+                await asyncio.to_thread(self._prune_windowed_stats)
+                retention_days = self.settings.history_retention_days
+                compacted = await asyncio.to_thread(self.round_history.compact, retention_days)
+                if compacted:
+                    logger.info(f"已将 {compacted} 条过期对局历史汇总为每日统计。")
             except Exception as e:
                 logger.error(f"猜卡插件周期性清理任务失败: {e}", exc_info=True)
 
     def _get_resource_path_or_url(self, relative_path: str) -> Optional[Union[Path, str]]:
         """根据配置返回资源的本地Path对象或远程URL字符串。"""
-        use_local = self.config.get("use_local_resources", True)
-        if use_local:
+        if self.settings.use_local_resources:
             path = self.resources_dir / relative_path
             return path if path.exists() else None
         else:
-            base_url = self.config.get("remote_resource_url_base", "").strip('/')
+            base_url = self.settings.remote_resource_url_base
             if not base_url:
                 logger.error("配置为使用远程资源，但 remote_resource_url_base 未设置。")
                 return None
             return f"{base_url}/{'/'.join(Path(relative_path).parts)}"
 
-    async def _open_image(self, relative_path: str) -> Optional[Image.Image]:
-        """打开一个资源图片，无论是本地路径还是远程URL。"""
-        source = self._get_resource_path_or_url(relative_path)
-        if not source:
+    def _open_asset_pack(self) -> Optional[AssetPack]:
+        """本地模式下若 resources 目录中有资源包则映射它；资源包损坏时回退到散落的图片文件。"""
+        if not self.settings.use_local_resources:
+            return None
+        pack_path = self.resources_dir / ASSET_PACK_NAME
+        if not pack_path.exists():
             return None
-        
         try:
-            if isinstance(source, str) and source.startswith(('http://', 'https://')):
-                session = await self._get_session()
-                if not session:
-                    logger.error("无法获取远程图片: `aiohttp` 模块未安装。")
-                    return None
-                
-                async with session.get(source) as response:
-                    response.raise_for_status() # Will raise an error for non-200 status
-                    image_data = await response.read()
-                    return Image.open(io.BytesIO(image_data))
-            else:
-                return Image.open(source)
+            pack = AssetPack(pack_path)
+        except (OSError, AssetPackError) as e:
+            logger.error(f"加载资源包 {pack_path} 失败: {e}，将使用 resources 目录下的图片文件。")
+            return None
+        logger.info(f"已加载资源包 {pack_path.name}，共 {len(pack)} 个资源。")
+        return pack
+
+    def _local_resource_exists(self, relative_path: str) -> bool:
+        """本地资源是否存在于资源包或 resources 目录中"""
+        pack = self.asset_pack
+        if pack is not None and relative_path in pack:
+            return True
+        return (self.resources_dir / relative_path).exists()
+
+    async def _open_image(self, relative_path: str) -> Optional["Image.Image"]:
+        """
+        打开一个资源图片，无论是本地路径还是远程URL。
+        同一路径的并发请求共享一次下载与解码，返回的是同一个已解码的 Image 对象，
+        调用方不应原地修改它 (convert/resize/copy 都会返回新对象)。
+        """
+        try:
+            return await self._image_flight.do(relative_path, lambda: self._load_image(relative_path))
         except (URLError, Exception) as e:
-            logger.error(f"无法打开图片资源 {source}: {e}", exc_info=True)
+            logger.error(f"无法打开图片资源 {relative_path}: {e}", exc_info=True)
+            return None
+
+    async def _load_image(self, relative_path: str) -> Optional["Image.Image"]:
+        """实际获取并解码图片。优先从资源包读取，远程获取失败时回退到本地资源。"""
+        from PIL import Image
+
+        pack = self.asset_pack
+        packed = pack.get(relative_path) if pack is not None else None
+        if packed is not None:
+            with packed:
+                img = Image.open(io.BytesIO(packed))
+            img.load()
+            return img
+
+        source = self._get_resource_path_or_url(relative_path)
+        if not source:
             return None
 
+        if isinstance(source, str) and source.startswith(('http://', 'https://')):
+            try:
+                image_data = await self.fetch_client.get_bytes(source)
+            except CircuitOpenError as e:
+                return self._open_local_fallback(relative_path, e)
+            except Exception as e:
+                fallback = self._open_local_fallback(relative_path, e)
+                if fallback is None:
+                    raise
+                return fallback
+            img = Image.open(io.BytesIO(image_data))
+        else:
+            img = Image.open(source)
+        img.load() # 在共享之前完成解码
+        return img
+
+    def _open_local_fallback(self, relative_path: str, error: Exception) -> Optional["Image.Image"]:
+        """远程资源不可用时，尝试从本地 resources 目录打开同名资源。"""
+        from PIL import Image
+
+        path = self.resources_dir / relative_path
+        if path.exists():
+            logger.warning(f"远程资源 {relative_path} 获取失败 ({error})，已回退到本地资源。")
+            img = Image.open(path)
+            img.load()
+            return img
+        logger.warning(f"远程资源 {relative_path} 获取失败 ({error})，且本地没有可用的回退资源。")
+        return None
+
+    async def _resolve_image_file(self, relative_path: str) -> Optional[Union[str, bytes]]:
+        """
+        将资源解析为可直接交给平台适配器发送的内容，用 _image_component 生成消息段。
+        远程模式下先下载到 image_cache 目录 (同一资源的并发请求只下载一次)，之后同一张图片
+        的重复发送都复用该文件，适配器不必再自行下载 URL。
+        下载失败时依次回退到本地 resources 目录和原始 URL。
+        资源包中的图片直接返回其字节内容，不解出到磁盘。
+        """
+        pack = self.asset_pack
+        packed = pack.get(relative_path) if pack is not None else None
+        if packed is not None:
+            with packed:
+                return bytes(packed)
+
+        source = self._get_resource_path_or_url(relative_path)
+        if not source:
+            return None
+        if not (isinstance(source, str) and source.startswith(('http://', 'https://'))):
+            return str(source)
+
+        cached_path = self.image_cache_dir / relative_path
+        if cached_path.exists():
+            return str(cached_path)
+
+        try:
+            return await self._image_flight.do(
+                ("file", relative_path), lambda: self._download_to_cache(source, cached_path)
+            )
+        except Exception as e:
+            local_path = self.resources_dir / relative_path
+            if local_path.exists():
+                logger.warning(f"下载图片 {relative_path} 失败 ({e})，已回退到本地资源。")
+                return str(local_path)
+            logger.warning(f"下载图片 {relative_path} 失败 ({e})，将直接发送URL。")
+            return source
+
+    async def _download_to_cache(self, url: str, cached_path: Path) -> str:
+        data = await self.fetch_client.get_bytes(url)
+        await asyncio.to_thread(self._write_cache_file, cached_path, data)
+        return str(cached_path)
+
+    @staticmethod
+    def _write_cache_file(path: Path, data: bytes):
+        """原子地写入缓存文件，避免并发读取到写了一半的图片。"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
     def _is_group_allowed(self, event: AstrMessageEvent) -> bool:
         """
         检查当前消息是否被允许.
         - 如果白名单为空, 则允许所有群聊和私聊.
         - 如果白名单不为空, 则只允许在白名单内的群聊中触发, 并禁用所有私聊.
         """
-        whitelist = self.config.get("group_whitelist", [])
-        
-        if not whitelist:
-            return True # 白名单为空, 允许所有
-        
-        # 白名单不为空, 开始严格检查
-        group_id = event.get_group_id()
-        if group_id and str(group_id) in whitelist:
-            return True # 是白名单中的群聊, 允许
-            
-        return False # 是私聊, 或非白名单群聊, 均不允许
+        return self.settings.is_group_allowed(event.get_group_id())
 
     def get_conn(self) -> sqlite3.Connection:
         """获取数据库连接"""
@@ -299,6 +576,7 @@ class GuessCardPlugin(Star):  # type: ignore
         """根据提供的选项（缩略图）列表生成一个网格状的选项图片"""
         if not options:
             return None
+        from PIL import Image, ImageDraw, ImageFont
 
         thumb_w, thumb_h = 128, 128 # 固定尺寸
         
@@ -331,7 +609,7 @@ class GuessCardPlugin(Star):  # type: ignore
                 thumb_img = await self._open_image(option['relative_thumb_path'])
                 if not thumb_img: continue
                 
-                thumb = thumb_img.convert("RGBA").resize((thumb_w, thumb_h), LANCZOS)
+                thumb = thumb_img.convert("RGBA").resize((thumb_w, thumb_h), get_lanczos())
                 
                 img.paste(thumb, (x, y), thumb)
                 
@@ -350,7 +628,7 @@ class GuessCardPlugin(Star):  # type: ignore
         # Save image
         output_dir = self.plugin_dir / "output"
         os.makedirs(output_dir, exist_ok=True)
-        img_path = output_dir / f"options_{int(time.time())}.png"
+        img_path = output_dir / f"options_{time.time_ns()}.png"
         img.save(img_path)
         return str(img_path)
 
@@ -377,37 +655,60 @@ class GuessCardPlugin(Star):  # type: ignore
         except Exception as e:
             logger.error(f"清理图片时出错: {e}")
 
+    def _cleanup_image_cache(self, max_age_seconds: int = 7 * 24 * 3600):
+        """清理长时间未更新的图片缓存，以便资源服务器更新后能重新下载"""
+        if not self.image_cache_dir.exists():
+            return
+
+        now = time.time()
+        try:
+            for file_path in self.image_cache_dir.rglob("*"):
+                if file_path.is_file() and (now - file_path.stat().st_mtime) > max_age_seconds:
+                    os.remove(file_path)
+        except Exception as e:
+            logger.error(f"清理图片缓存时出错: {e}")
+
     # --- 游戏逻辑 ---
-    def start_new_game(self, character_id: Optional[int] = None) -> Optional[Dict]:
-        """准备一轮新游戏，加入花前/花后逻辑"""
+    def start_new_game(self, character_id: Optional[int] = None, session_id: Optional[str] = None) -> Optional[Dict]:
+        """准备一轮新游戏，加入花前/花后逻辑。指定 session_id 时避开该会话最近出过的卡牌"""
         if not self.guess_cards or not self.characters_map:
             logger.error("无法开始游戏，因为卡牌数据未成功加载。")
             return None
 
-        card_pool = self.guess_cards
-        if character_id:
-            card_pool = [c for c in self.guess_cards if c['characterId'] == character_id]
-            if not card_pool:
-                logger.warning(f"没有找到角色ID为 {character_id} 的卡牌。")
-                return None
+        sampler = self.card_samplers.get(character_id or None)
+        if sampler is None:
+            logger.warning(f"没有找到角色ID为 {character_id} 的卡牌。")
+            return None
+
+        recent = None
+        if session_id:
+            recent = self.recent_cards.get(session_id)
+            if recent is None:
+                recent = self.recent_cards[session_id] = RecentHistory(self.settings.recent_card_window)
+                if len(self.recent_cards) > MAX_RECENT_SESSIONS:
+                    self.recent_cards.popitem(last=False)
+            else:
+                self.recent_cards.move_to_end(session_id)
+        card = sampler.sample(exclude=recent)
+        if recent is not None:
+            recent.add(card['id'])
 
-        card = random.choice(card_pool)
-        difficulty = random.choice(["easy", "normal", "hard"])
+        difficulty = DIFFICULTIES[self.difficulty_table.sample()]
         card_type = random.choice(["normal", "after_training"])
         
         # 修正: 使用 card['id'] 和 card_type 来构建正确的问题图片文件名
         question_img_name = f"{card['id']}_card_{card_type}_{difficulty}.png"
         answer_image_filename = f"card_{card_type}.png"
+        question_image_path = f"questions/{question_img_name}"
+        answer_image_path = f'member/{card["assetbundleName"]}/{answer_image_filename}'
 
-        # 当使用本地资源时，检查图片是否存在
-        if self.config.get("use_local_resources", True):
-            question_img_path = self.resources_dir / "questions" / question_img_name
-            if not question_img_path.exists():
-                logger.error(f"问题图片未找到: {question_img_path}")
+        # 当使用本地资源时，检查图片是否存在 (资源包或 resources 目录)
+        if self.settings.use_local_resources:
+            if not self._local_resource_exists(question_image_path):
+                logger.error(f"问题图片未找到: {question_image_path}")
                 return None
 
-            answer_image_path = self.resources_dir / "member" / card["assetbundleName"] / answer_image_filename
-            if not answer_image_path.exists():
+            if not self._local_resource_exists(answer_image_path):
                 logger.error(f"预处理的答案图片未找到: {answer_image_path}")
                 return None
 
@@ -427,18 +728,16 @@ class GuessCardPlugin(Star):  # type: ignore
         if not show_training_hint:
             base_score += 1
         
-        # 获取答案卡牌图片路径 (已预先压缩)
-        
         return {
             "card": card,
             "difficulty": difficulty,
             "card_state": card_type,
-            "question_image_source": self._get_resource_path_or_url(f"questions/{question_img_name}"),
+            "question_image_path": question_image_path,
             "character": character,
             "score": base_score,
             "show_rarity_hint": show_rarity_hint,
             "show_training_hint": show_training_hint,
-            "answer_image_source": self._get_resource_path_or_url(f'member/{card["assetbundleName"]}/{answer_image_filename}'),
+            "answer_image_path": answer_image_path,
         }
 
     # --- 指令处理 ---
@@ -447,9 +746,10 @@ class GuessCardPlugin(Star):  # type: ignore
         """开始一轮猜卡游戏"""
         if not self._is_group_allowed(event):
             return
+        await self._wait_ready()
             
         session_id = event.unified_msg_origin
-        cooldown = self.config.get("game_cooldown_seconds", 60)
+        cooldown = self.settings.game_cooldown_seconds
         last_end_time = self.last_game_end_time.get(session_id, 0)
         time_since_last_game = time.time() - last_end_time
 
@@ -462,147 +762,69 @@ class GuessCardPlugin(Star):  # type: ignore
             yield event.plain_result("......有一个正在进行的游戏了呢。")
 
         elif not self._can_play(event.get_sender_id()):
-            yield event.plain_result(f"......你今天的游戏次数已达上限（{self.config.get('daily_play_limit', 10)}次），请明天再来吧......")
+            yield event.plain_result(f"......你今天的游戏次数已达上限（{self.settings.daily_play_limit}次），请明天再来吧......")
         
         else:
-            # --- 新增：解析指定角色 ---
+            # --- 新增：解析连续模式与指定角色 ---
             args = event.message_str.strip().split(maxsplit=1)
+            marathon_rounds, char_name_arg = self._parse_marathon_args(args[1] if len(args) > 1 else "")
             target_char_id = None
-            target_char_name = ""
-            if len(args) > 1:
-                char_name_arg = args[1].lower()
-                # 优先完全匹配
-                if char_name_arg in self.character_name_to_id_map:
-                    target_char_id = self.character_name_to_id_map[char_name_arg]
-                else:
-                    # 模糊匹配
-                    for name, char_id in self.character_name_to_id_map.items():
-                        if name.startswith(char_name_arg):
-                            target_char_id = char_id
-                            break
-                
+            if char_name_arg:
+                target_char_id = self._match_character(char_name_arg)
                 if not target_char_id:
-                    yield event.plain_result(f"......没有找到名为 '{args[1]}' 的角色。")
+                    yield event.plain_result(f"......没有找到名为 '{char_name_arg}' 的角色。")
+                    return
+
+            if marathon_rounds:
+                max_rounds = self.settings.marathon_max_rounds
+                if max_rounds < 1:
+                    yield event.plain_result("......连续模式没有开启呢。")
                     return
+                marathon_rounds = min(marathon_rounds, max_rounds)
             # --- 结束 ---
 
-            # 记录游戏开始，并增加该用户的每日游戏次数
+            # 记录游戏开始，并增加该用户的每日游戏次数 (连续模式也只计一次)
             self._record_game_start(event.get_sender_id(), event.get_sender_name())
 
             # --- 新增：发送统计信标 ---
-            asyncio.create_task(self._send_stats_ping("guess_card"))
+            self._send_stats_ping("guess_card")
 
-            game_data = self.start_new_game(character_id=target_char_id)
-            if not game_data:
-                yield event.plain_result("......开始游戏失败，可能是缺少资源文件或配置错误，请联系管理员。")
+            if marathon_rounds:
+                async for result in self._run_marathon(event, session_id, target_char_id, marathon_rounds):
+                    yield result
                 return
 
-            # --- V1.1.0 新功能：生成动态答案池图片 ---
-            options_img_path = None
-            correct_card = game_data['card']
-            difficulty = game_data['difficulty']
-            show_training_hint = game_data['show_training_hint']
-            show_rarity_hint = game_data['show_rarity_hint']
-
-            candidate_pool = []
-            if self.guess_cards:
-                character_id = correct_card['characterId']
-                rarity = correct_card['cardRarityType']
-
-                # 修正后的逻辑：
-                # 1. 基础范围是该角色的所有卡牌
-                candidate_pool = [c for c in self.guess_cards if c['characterId'] == character_id]
-                
-                # 2. 如果有星级提示，则将其作为过滤器应用
-                if show_rarity_hint:
-                    candidate_pool = [c for c in candidate_pool if c['cardRarityType'] == rarity]
-            
-            options = []
-            # 提示决定选项的展示方式
-            if show_training_hint:
-                # 有状态提示：只显示提示对应的那个状态的缩略图
-                state_to_show = game_data['card_state']
-                for card in candidate_pool:
-                    relative_thumb_path = f"member_thumb/{card['assetbundleName']}_{state_to_show}.png"
-                    options.append({'id': card['id'], 'relative_thumb_path': relative_thumb_path})
-                random.shuffle(options) # 单独排序
-            else:
-                # 没有状态提示：显示两种状态的缩略图，并让同一张卡的花前花后相邻
-                card_thumb_groups = []
-                for card in candidate_pool:
-                    group = []
-                    relative_normal_path = f"member_thumb/{card['assetbundleName']}_normal.png"
-                    group.append({'id': card['id'], 'relative_thumb_path': relative_normal_path})
-                    
-                    relative_after_path = f"member_thumb/{card['assetbundleName']}_after_training.png"
-                    group.append({'id': card['id'], 'relative_thumb_path': relative_after_path})
-                    
-                    if group:
-                        card_thumb_groups.append(group)
-                
-                # 随机打乱卡牌（组）的顺序，但保持花前花后配对
-                random.shuffle(card_thumb_groups)
-                # 将分组展开成最终的选项列表
-                options = [thumb for group in card_thumb_groups for thumb in group]
-            
-            if options:
-                # 横向最多显示5个，让图片比例协调
-                cols = min(len(options), 5)
-                options_img_path = await self._create_options_image(options, cols=cols)
-            # --- V1.1.0 功能结束 ---
+            prepared = await self._prepare_round(target_char_id, session_id)
+            if not prepared:
+                yield event.plain_result("......开始游戏失败，可能是缺少资源文件或配置错误，请联系管理员。")
+                return
+            game_data = prepared["game_data"]
+            question_file = prepared["question_file"]
+            answer_file_task = prepared["answer_file_task"]
 
             # 在后台日志中输出答案，方便测试
             logger.info(f"[猜卡插件] 新游戏开始. 答案ID: {game_data['card']['id']}")
                 
             self.context.active_game_sessions.add(session_id)
-            
-            hints = []
-            if game_data["show_rarity_hint"]:
-                rarity_map = {
-                    "rarity_3": "⭐⭐⭐", 
-                    "rarity_4": "⭐⭐⭐⭐",
-                }
-                hints.append(f"星级提示: {rarity_map.get(game_data['card']['cardRarityType'], '未知')}")
-            
-            if game_data["show_training_hint"]:
-                state_text = "花后" if game_data["card_state"] == "after_training" else "花前"
-                hints.append(f"状态提示: {state_text}")
 
-            timeout_seconds = self.config.get("answer_timeout", 30)
-            character_name = game_data["character"]["name"]
-            
-            # 如果指定了角色，在消息中提示
-            if target_char_id:
-                intro_text = f".......嗯\n难度: {game_data['difficulty']}，基础分: {game_data['score']}\n这是 {character_name} 的一张卡牌，请在{timeout_seconds}秒内发送卡牌ID进行回答。\n"
-            else:
-                intro_text = f".......嗯\n难度: {game_data['difficulty']}，基础分: {game_data['score']}\n这是 {character_name} 的一张卡牌，请在{timeout_seconds}秒内发送卡牌ID进行回答。\n"
-            
-            hint_text = "\n".join(hints) + "\n" if hints else ""
-            
-            msg_chain: list = [Comp.Plain(intro_text + hint_text)]
+            timeout_seconds = self.settings.answer_timeout
+            msg_chain = self._build_question_chain(prepared, timeout_seconds)
 
             try:
-                question_source = game_data.get("question_image_source")
-                if question_source:
-                    msg_chain.append(Comp.Image(file=str(question_source)))
-                
-                if options_img_path:
-                    msg_chain.append(Comp.Image(file=options_img_path))
                 yield event.chain_result(msg_chain)
+                round_started_at = time.time()
             except Exception as e:
                 logger.error(f"......发送图片失败: {e}. Check if the file path is correct and accessible.")
                 yield event.plain_result("......发送问题图片时出错，游戏中断。")
                 self.context.active_game_sessions.remove(session_id)
+                answer_file_task.cancel()
                 return
 
-            timeout_seconds = self.config.get("answer_timeout", 30)
-            
             # 为当前轮次添加猜测次数计数器
             guess_attempts_count = 0
-            max_guess_attempts = self.config.get("max_guess_attempts", 10)
+            max_guess_attempts = self.settings.max_guess_attempts
             
             # --- 新增: 游戏状态变量 ---
-            game_ended_by_timeout = False
             winner_info = None
             game_ended_by_attempts = False
 
@@ -627,7 +849,7 @@ class GuessCardPlugin(Star):  # type: ignore
                             winner_name = answer_event.get_sender_name()
                             score = game_data["score"]
                             
-                            self._update_stats(winner_id, winner_name, score, correct=True)
+                            self._update_stats(winner_id, winner_name, score, correct=True, group_id=answer_event.get_group_id())
 
                             # 记录胜利者信息，但不立即发送消息
                             winner_info = {"name": winner_name, "id": winner_id, "score": score}
@@ -635,7 +857,7 @@ class GuessCardPlugin(Star):  # type: ignore
                             controller.stop()
                             return # 回答正确，直接退出
                         else:
-                            self._update_stats(answer_event.get_sender_id(), answer_event.get_sender_name(), 0, correct=False)
+                            self._update_stats(answer_event.get_sender_id(), answer_event.get_sender_name(), 0, correct=False, group_id=answer_event.get_group_id())
                     except (ValueError, IndexError):
                         pass
 
@@ -647,39 +869,381 @@ class GuessCardPlugin(Star):  # type: ignore
             try:
                 await guess_waiter(event)
             except TimeoutError:
-                game_ended_by_timeout = True
+                pass
             finally:
                 self.last_game_end_time[session_id] = time.time() # 记录游戏结束时间
                 if session_id in self.context.active_game_sessions:
                     self.context.active_game_sessions.remove(session_id)
             
             # --- 统一在游戏结束后公布结果 ---
-            correct_id = game_data['card']['id']
-
-            text_msg = []
             if winner_info:
-                text_msg.append(Comp.Plain(f"{winner_info['name']} ......回答正确了呢......\n"))
-                text_msg.append(Comp.Plain(f"获得 {winner_info['score']} 分......\n答案是: ID {correct_id}\n"))
+                outcome = "correct"
             elif game_ended_by_attempts:
-                text_msg.append(Comp.Plain(f"本轮猜测次数已达上限（{max_guess_attempts}次）......无人答对......\n"))
-                text_msg.append(Comp.Plain(f"正确答案是: ID {correct_id}\n"))
-            elif game_ended_by_timeout:
-                text_msg.append(Comp.Plain("时间到.............好像......没有人答对......\n"))
-                text_msg.append(Comp.Plain(f"正确答案是: ID {correct_id}\n"))
-            
+                outcome = "attempts"
+            else:
+                outcome = "timeout"
+            self._record_round(
+                session_id, event.get_group_id(), game_data, winner_info, guess_attempts_count, outcome, round_started_at
+            )
+
+            text_msg = self._build_result_text(game_data, winner_info, outcome, max_guess_attempts)
             if text_msg:
                 yield event.chain_result(text_msg)
 
-            # 使用预先处理好的答案图片
-            question_source = game_data.get("question_image_source")
-            answer_source = game_data.get("answer_image_source")
-            image_msg = []
-            if question_source: image_msg.append(Comp.Image(file=str(question_source)))
-            if answer_source: image_msg.append(Comp.Image(file=str(answer_source)))
+            # 使用预先处理好的答案图片，题目图片复用开局时的同一个本地文件
+            answer_file = await answer_file_task
+            image_msg = self._build_answer_images(question_file, answer_file)
+            if image_msg:
+                yield event.chain_result(image_msg)
+
+    @staticmethod
+    def _parse_marathon_args(arg_text: str) -> Tuple[int, str]:
+        """解析 `连续 [轮数] [角色名]`，返回 (轮数, 剩余参数)。不是连续模式时轮数为 0"""
+        match = MARATHON_PATTERN.match(arg_text.strip())
+        if not match:
+            return 0, arg_text.strip()
+        rounds = int(match.group(1)) if match.group(1) else DEFAULT_MARATHON_ROUNDS
+        return max(rounds, 1), match.group(2).strip()
+
+    def _match_character(self, char_name_arg: str) -> Optional[int]:
+        """按角色名查找角色ID，优先完全匹配，其次前缀匹配"""
+        char_name_arg = char_name_arg.lower()
+        if char_name_arg in self.character_name_to_id_map:
+            return self.character_name_to_id_map[char_name_arg]
+        for name, char_id in self.character_name_to_id_map.items():
+            if name.startswith(char_name_arg):
+                return char_id
+        return None
+
+    def _build_options(self, game_data: Dict) -> List[Dict]:
+        """--- V1.1.0 新功能：根据提示生成动态答案池 (缩略图列表) ---"""
+        correct_card = game_data['card']
+        show_training_hint = game_data['show_training_hint']
+        show_rarity_hint = game_data['show_rarity_hint']
+
+        candidate_pool = []
+        if self.guess_cards:
+            character_id = correct_card['characterId']
+            rarity = correct_card['cardRarityType']
+
+            # 修正后的逻辑：
+            # 1. 基础范围是该角色的所有卡牌
+            candidate_pool = self.cards_by_character.get(character_id, [])
             
+            # 2. 如果有星级提示，则将其作为过滤器应用
+            if show_rarity_hint:
+                candidate_pool = [c for c in candidate_pool if c['cardRarityType'] == rarity]
+        
+        options = []
+        # 提示决定选项的展示方式
+        if show_training_hint:
+            # 有状态提示：只显示提示对应的那个状态的缩略图
+            state_to_show = game_data['card_state']
+            for card in candidate_pool:
+                relative_thumb_path = f"member_thumb/{card['assetbundleName']}_{state_to_show}.png"
+                options.append({'id': card['id'], 'relative_thumb_path': relative_thumb_path})
+            random.shuffle(options) # 单独排序
+        else:
+            # 没有状态提示：显示两种状态的缩略图，并让同一张卡的花前花后相邻
+            card_thumb_groups = []
+            for card in candidate_pool:
+                group = []
+                relative_normal_path = f"member_thumb/{card['assetbundleName']}_normal.png"
+                group.append({'id': card['id'], 'relative_thumb_path': relative_normal_path})
+                
+                relative_after_path = f"member_thumb/{card['assetbundleName']}_after_training.png"
+                group.append({'id': card['id'], 'relative_thumb_path': relative_after_path})
+                
+                if group:
+                    card_thumb_groups.append(group)
+            
+            # 随机打乱卡牌（组）的顺序，但保持花前花后配对
+            random.shuffle(card_thumb_groups)
+            # 将分组展开成最终的选项列表
+            options = [thumb for group in card_thumb_groups for thumb in group]
+        return options
+
+    async def _prepare_round(self, character_id: Optional[int], session_id: str) -> Optional[Dict]:
+        """
+        准备一轮游戏: 抽卡，并行准备题目图片与选项图，答案图片在后台获取。
+        返回的 answer_file_task 由调用方在公布答案时等待，放弃本轮时需取消。抽卡失败时返回 None。
+        """
+        game_data = self.start_new_game(character_id=character_id, session_id=session_id)
+        if not game_data:
+            return None
+
+        options = self._build_options(game_data)
+        # 题目图片与选项图并行准备；答案图片在本轮进行期间于后台下载，结束时直接复用
+        question_file_task = asyncio.create_task(self._resolve_image_file(game_data["question_image_path"]))
+        answer_file_task = asyncio.create_task(self._resolve_image_file(game_data["answer_image_path"]))
+        options_img_path = None
+        try:
+            if options:
+                # 横向最多显示5个，让图片比例协调
+                cols = min(len(options), 5)
+                options_img_path = await self._create_options_image(options, cols=cols)
+            question_file = await question_file_task
+        except BaseException:
+            question_file_task.cancel()
+            answer_file_task.cancel()
+            raise
+
+        return {
+            "game_data": game_data,
+            "question_file": question_file,
+            "options_img_path": options_img_path,
+            "answer_file_task": answer_file_task,
+        }
+
+    @staticmethod
+    def _discard_prepared_round(task: "asyncio.Task"):
+        """放弃一个 _prepare_round 任务，连同它在后台获取的答案图片"""
+        def cleanup(t: "asyncio.Task"):
+            if not t.cancelled() and t.exception() is None and t.result():
+                t.result()["answer_file_task"].cancel()
+
+        task.cancel()
+        task.add_done_callback(cleanup)
+
+    def _build_question_chain(self, prepared: Dict, timeout_seconds: int, header: str = "") -> list:
+        """生成出题消息：难度、基础分、提示、题目图片与选项图"""
+        game_data = prepared["game_data"]
+        hints = []
+        if game_data["show_rarity_hint"]:
+            rarity_map = {
+                "rarity_3": "⭐⭐⭐", 
+                "rarity_4": "⭐⭐⭐⭐",
+            }
+            hints.append(f"星级提示: {rarity_map.get(game_data['card']['cardRarityType'], '未知')}")
+        
+        if game_data["show_training_hint"]:
+            state_text = "花后" if game_data["card_state"] == "after_training" else "花前"
+            hints.append(f"状态提示: {state_text}")
+
+        character_name = game_data["character"]["name"]
+        intro_text = f"{header}.......嗯\n难度: {game_data['difficulty']}，基础分: {game_data['score']}\n这是 {character_name} 的一张卡牌，请在{timeout_seconds}秒内发送卡牌ID进行回答。\n"
+        hint_text = "\n".join(hints) + "\n" if hints else ""
+
+        msg_chain: list = [Comp.Plain(intro_text + hint_text)]
+        if prepared["question_file"]:
+            msg_chain.append(self._image_component(prepared["question_file"]))
+        if prepared["options_img_path"]:
+            msg_chain.append(Comp.Image(file=prepared["options_img_path"]))
+        return msg_chain
+
+    @staticmethod
+    def _build_result_text(game_data: Dict, winner_info: Optional[Dict], outcome: str, max_guess_attempts: int) -> list:
+        correct_id = game_data['card']['id']
+        text_msg = []
+        if outcome == "correct" and winner_info:
+            text_msg.append(Comp.Plain(f"{winner_info['name']} ......回答正确了呢......\n"))
+            text_msg.append(Comp.Plain(f"获得 {winner_info['score']} 分......\n答案是: ID {correct_id}\n"))
+        elif outcome == "attempts":
+            text_msg.append(Comp.Plain(f"本轮猜测次数已达上限（{max_guess_attempts}次）......无人答对......\n"))
+            text_msg.append(Comp.Plain(f"正确答案是: ID {correct_id}\n"))
+        elif outcome == "timeout":
+            text_msg.append(Comp.Plain("时间到.............好像......没有人答对......\n"))
+            text_msg.append(Comp.Plain(f"正确答案是: ID {correct_id}\n"))
+        return text_msg
+
+    @staticmethod
+    def _image_component(source: Union[str, bytes]) -> "Comp.Image":
+        """_resolve_image_file 的结果: 资源包中的图片为字节内容，其余为文件路径或 URL"""
+        if isinstance(source, bytes):
+            return Comp.Image.fromBytes(source)
+        return Comp.Image(file=source)
+
+    @classmethod
+    def _build_answer_images(cls, question_file: Optional[Union[str, bytes]],
+                             answer_file: Optional[Union[str, bytes]]) -> list:
+        image_msg = []
+        if question_file: image_msg.append(cls._image_component(question_file))
+        if answer_file: image_msg.append(cls._image_component(answer_file))
+        return image_msg
+
+    def _record_round(self, session_id: str, group_id: Optional[str], game_data: Dict, winner_info: Optional[Dict],
+                      attempts: int, outcome: str, started_at: float):
+        """将一局的结果放入对局历史的写入队列"""
+        self.round_history.record(RoundRecord(
+            session_id=session_id,
+            group_id=group_id or None,
+            card_id=game_data['card']['id'],
+            character_id=game_data['card']['characterId'],
+            difficulty=game_data['difficulty'],
+            card_state=game_data['card_state'],
+            show_rarity_hint=game_data['show_rarity_hint'],
+            show_training_hint=game_data['show_training_hint'],
+            winner_id=winner_info['id'] if winner_info else None,
+            attempts=attempts,
+            outcome=outcome,
+            started_at=started_at,
+            duration=time.time() - started_at,
+        ))
+
+    async def _run_marathon(self, event: AstrMessageEvent, session_id: str, character_id: Optional[int], total_rounds: int):
+        """
+        连续模式: 在同一个 session_waiter 中连续进行 total_rounds 轮。
+        每一轮进行期间在后台准备下一轮的题目图片与选项图；一轮结束后直接在等待器中公布答案并发出下一题。
+        本次所有作答的统计在结束时一次性写入数据库。任意一轮超时无人作答则提前结束。
+        AstrBot 的超时由独立的计时任务触发，可能发生在等待器正在公布答案时；
+        revealed 标记当前轮已经进入公布流程，超时分支据此不再重复公布与记录。
+        """
+        timeout_seconds = self.settings.answer_timeout
+        max_guess_attempts = self.settings.max_guess_attempts
+        group_id = event.get_group_id()
+
+        current = await self._prepare_round(character_id, session_id)
+        if not current:
+            yield event.plain_result("......开始游戏失败，可能是缺少资源文件或配置错误，请联系管理员。")
+            return
+
+        self.context.active_game_sessions.add(session_id)
+        round_index = 1
+        attempts = 0
+        solved_rounds = 0
+        revealed = False # 当前轮是否已由等待器公布答案
+        finished = False # 等待器已结束 (包括超时)，不再发出新题
+        next_task: Optional[asyncio.Task] = None
+        pending_stats: List[Tuple[str, str, int, bool, Optional[str]]] = [] # 结束时批量写入
+        player_scores: Dict[str, List] = {} # user_id -> [昵称, 本次得分]
+        round_lock = asyncio.Lock()
+
+        def header() -> str:
+            return f"连续模式 第 {round_index}/{total_rounds} 轮\n"
+
+        def prepare_next():
+            nonlocal next_task
+            if round_index < total_rounds:
+                next_task = asyncio.create_task(self._prepare_round(character_id, session_id))
+
+        try:
+            logger.info(f"[猜卡插件] 连续模式开始 ({total_rounds} 轮). 第1轮答案ID: {current['game_data']['card']['id']}")
+            yield event.chain_result(self._build_question_chain(current, timeout_seconds, header()))
+            round_started_at = time.time()
+        except Exception as e:
+            logger.error(f"......发送图片失败: {e}. Check if the file path is correct and accessible.")
+            yield event.plain_result("......发送问题图片时出错，游戏中断。")
+            self.context.active_game_sessions.discard(session_id)
+            current["answer_file_task"].cancel()
+            return
+        prepare_next()
+
+        async def advance(answer_event: AstrMessageEvent, outcome: str, winner_info: Optional[Dict]) -> bool:
+            """公布当前轮的答案并发出下一题；没有下一轮时返回 False"""
+            nonlocal current, round_index, attempts, round_started_at, next_task, revealed
+            game_data = current["game_data"]
+            self._record_round(session_id, group_id, game_data, winner_info, attempts, outcome, round_started_at)
+            answer_file = await current["answer_file_task"]
+            result_chain = self._build_result_text(game_data, winner_info, outcome, max_guess_attempts)
+            result_chain += self._build_answer_images(current["question_file"], answer_file)
+            await answer_event.send(answer_event.chain_result(result_chain))
+
+            # 取走下一轮的准备任务，之后等待器结束时不会再取消它
+            task, next_task = next_task, None
+            if task is None:
+                return False
+            if finished:
+                self._discard_prepared_round(task)
+                return False
+            prepared = await task
+            if not prepared:
+                return False
+            if finished:
+                prepared["answer_file_task"].cancel()
+                return False
+            current, attempts = prepared, 0
+            round_index += 1
+            logger.info(f"[猜卡插件] 连续模式第{round_index}轮. 答案ID: {current['game_data']['card']['id']}")
+            await answer_event.send(answer_event.chain_result(self._build_question_chain(current, timeout_seconds, header())))
+            if finished:
+                return False # 发出新题期间已超时
+            # 新题发出后才开始计时，此前 revealed 保持为 True
+            revealed = False
+            round_started_at = time.time()
+            prepare_next()
+            return True
+
+        @session_waiter(timeout=timeout_seconds)  # type: ignore
+        async def marathon_waiter(controller: SessionController, answer_event: AstrMessageEvent):
+            nonlocal attempts, solved_rounds, revealed
+
+            answer_id_str = re.sub(r"^[!！]", "", answer_event.message_str.strip())
+            if not answer_id_str.isdigit():
+                return
+
+            answered_round = round_index
+            async with round_lock:
+                if round_index != answered_round:
+                    return # 切换轮次期间收到的上一轮答案
+
+                attempts += 1
+                user_id = answer_event.get_sender_id()
+                user_name = answer_event.get_sender_name()
+                game_data = current["game_data"]
+                if int(answer_id_str) == game_data["card"]["id"]:
+                    score = game_data["score"]
+                    pending_stats.append((user_id, user_name, score, True, answer_event.get_group_id()))
+                    entry = player_scores.setdefault(user_id, [user_name, 0])
+                    entry[0] = user_name
+                    entry[1] += score
+                    solved_rounds += 1
+                    outcome, winner_info = "correct", {"name": user_name, "id": user_id, "score": score}
+                else:
+                    pending_stats.append((user_id, user_name, 0, False, answer_event.get_group_id()))
+                    if attempts < max_guess_attempts:
+                        return
+                    outcome, winner_info = "attempts", None
+
+                # 在任何 await 之前标记并重置计时，公布答案与发出下一题期间不会被判为超时
+                revealed = True
+                controller.keep(timeout=timeout_seconds, reset_timeout=True)
+                try:
+                    has_next = await advance(answer_event, outcome, winner_info)
+                except Exception as e:
+                    logger.error(f"连续模式切换轮次失败: {e}", exc_info=True)
+                    has_next = False
+                if has_next:
+                    controller.keep(timeout=timeout_seconds, reset_timeout=True)
+                else:
+                    controller.stop()
+
+        timed_out = False
+        try:
+            await marathon_waiter(event)
+        except TimeoutError:
+            timed_out = True
+        finally:
+            finished = True
+            self.last_game_end_time[session_id] = time.time() # 记录游戏结束时间
+            self.context.active_game_sessions.discard(session_id)
+            if next_task is not None:
+                self._discard_prepared_round(next_task)
+                next_task = None
+            # 本次所有作答统计在一个事务中提交
+            if pending_stats:
+                self._update_stats_batch(pending_stats)
+
+        if timed_out and current and not revealed:
+            # 超时的这一轮还未公布答案
+            self._record_round(session_id, group_id, current["game_data"], None, attempts, "timeout", round_started_at)
+            text_msg = self._build_result_text(current["game_data"], None, "timeout", max_guess_attempts)
+            yield event.chain_result(text_msg)
+            answer_file = await current["answer_file_task"]
+            image_msg = self._build_answer_images(current["question_file"], answer_file)
             if image_msg:
                 yield event.chain_result(image_msg)
 
+        summary = [f"连续模式结束......共进行了 {round_index} 轮，答对 {solved_rounds} 轮。"]
+        if timed_out and not revealed and round_index < total_rounds:
+            summary.append(f"（第 {round_index} 轮没有人作答，提前结束了呢）")
+        elif round_index < total_rounds:
+            summary.append("（没能进入下一轮，提前结束了呢）")
+        if player_scores:
+            summary.append("本次得分:")
+            ranked = sorted(player_scores.values(), key=lambda entry: entry[1], reverse=True)
+            summary.extend(f"  {name}: {score} 分" for name, score in ranked)
+        yield event.plain_result("\n".join(summary))
+
 
     @filter.command("猜卡帮助")
     async def show_guess_card_help(self, event: AstrMessageEvent):
@@ -690,12 +1254,18 @@ class GuessCardPlugin(Star):  # type: ignore
             "--- 猜卡插件帮助 ---\n\n"
             "**基础指令**\n"
             "  `猜卡` - 完全随机猜一张卡\n"
-            "  `猜卡 [角色名]` - 猜指定角色的卡 (例如: 猜卡 mfy)\n\n"
+            "  `猜卡 [角色名]` - 猜指定角色的卡 (例如: 猜卡 mfy)\n"
+            "  `猜卡 连续 [轮数] [角色名]` - 连续模式，一次开局连续猜多轮 (例如: 猜卡 连续 10)\n\n"
             "**数据统计**\n"
             "  `猜卡排行榜` - 查看猜卡总分排行榜\n"
-            "  `猜卡分数` - 查看自己的猜卡数据统计\n\n"
+            "  `猜卡排行榜 本群` - 查看本群的猜卡排行榜\n"
+            "  `猜卡排行榜 [日/周/月]` - 查看今日/本周/本月排行榜 (可与 本群 组合)\n"
+            "  `猜卡分数` - 查看自己的猜卡数据统计\n"
+            "  `猜卡分数 本群` - 查看自己在本群的猜卡数据\n\n"
             "**管理员指令**\n"
-            "  `重置猜卡次数 [用户ID]` - 重置指定用户的每日游戏次数"
+            "  `重置猜卡次数 [用户ID]` - 重置指定用户的每日游戏次数\n"
+            "  `猜卡导出 [csv/jsonl]` - 导出所有玩家的统计数据\n"
+            "  `猜卡导入 [文件路径]` - 从导出文件合并导入玩家统计数据"
         )
         yield event.plain_result(help_text)
 
@@ -705,8 +1275,14 @@ class GuessCardPlugin(Star):  # type: ignore
         """显示玩家自己的猜卡积分和统计数据"""
         if not self._is_group_allowed(event):
             return
+        await self._wait_ready()
         user_id = event.get_sender_id()
         user_name = event.get_sender_name()
+
+        if self._parse_group_mode(event):
+            async for result in self._show_group_user_score(event):
+                yield result
+            return
         
         with self.get_conn() as conn:
             cursor = conn.cursor()
@@ -726,7 +1302,7 @@ class GuessCardPlugin(Star):  # type: ignore
             cursor.execute("SELECT COUNT(*) FROM user_stats WHERE score > ?", (score,))
             rank = cursor.fetchone()[0] + 1
         
-        daily_limit = self.config.get("daily_play_limit", 10)
+        daily_limit = self.settings.daily_play_limit
         remaining_plays = daily_limit - daily_plays if last_play_date == time.strftime("%Y-%m-%d") else daily_limit
         
         stats_text = (
@@ -742,17 +1318,71 @@ class GuessCardPlugin(Star):  # type: ignore
         
         yield event.plain_result(stats_text)
 
+    async def _show_group_user_score(self, event: AstrMessageEvent):
+        """显示玩家在当前群内的猜卡积分和排名"""
+        group_id = event.get_group_id()
+        user_id = event.get_sender_id()
+        user_name = event.get_sender_name()
+        if not group_id:
+            yield event.plain_result("......本群分数只能在群聊中查询。")
+            return
+
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT score, attempts, correct_attempts FROM group_user_stats WHERE group_id = ? AND user_id = ?",
+                (str(group_id), user_id),
+            )
+            user_data = cursor.fetchone()
+            if user_data:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM group_user_stats WHERE group_id = ? AND score > ?",
+                    (str(group_id), user_data[0]),
+                )
+                rank = cursor.fetchone()[0] + 1
+
+        if not user_data:
+            yield event.plain_result(f"......{user_name}，你还没有在本群参与过猜卡游戏哦。")
+            return
+
+        score, attempts, correct_attempts = user_data
+        accuracy = (correct_attempts * 100 / attempts) if attempts > 0 else 0
+
+        stats_text = (
+            f"--- {user_name} 在本群的猜卡数据 ---\n"
+            f"🏆 本群总分: {score} 分\n"
+            f"🎯 正确率: {accuracy:.1f}%\n"
+            f"🎮 答题次数: {attempts} 次\n"
+            f"✅ 答对次数: {correct_attempts} 次\n"
+            f"🏅 本群排名: 第 {rank} 名"
+        )
+        yield event.plain_result(stats_text)
+
+    @staticmethod
+    def _parse_group_mode(event: AstrMessageEvent) -> bool:
+        """指令参数中包含 `本群` / `group` 时使用本群数据"""
+        args = event.message_str.strip().split()[1:]
+        return any(arg.lower() in ("本群", "群", "group") for arg in args)
+
+    @staticmethod
+    def _parse_ranking_window(event: AstrMessageEvent) -> Optional[str]:
+        """解析指令参数中的时间窗口 (日/周/月)，未指定时返回 None 表示总榜"""
+        for arg in event.message_str.strip().split()[1:]:
+            window_type = RANKING_WINDOW_ALIASES.get(arg.lower())
+            if window_type:
+                return window_type
+        return None
+
 
     @filter.command("重置猜卡次数", alias={"resetgl"})
     async def reset_guess_limit(self, event: AstrMessageEvent):
         """重置用户猜卡次数（仅限管理员）"""
         if not self._is_group_allowed(event):
             return
+        await self._wait_ready()
 
         sender_id = event.get_sender_id()
-        super_users = self.config.get("super_users", [])
-
-        if str(sender_id) not in super_users:
+        if not self.settings.is_super_user(sender_id):
             yield event.plain_result("......抱歉，您没有权限使用此指令......")
             return
 
@@ -773,162 +1403,266 @@ class GuessCardPlugin(Star):  # type: ignore
             yield event.plain_result(f"......未找到用户 {target_id_str} 的游戏记录，无法重置。")
 
 
+    @filter.command("猜卡导出", alias={"gcexport"})
+    async def export_stats(self, event: AstrMessageEvent):
+        """导出玩家统计数据为 CSV 或 JSONL（仅限管理员）"""
+        if not self._is_group_allowed(event):
+            return
+        await self._wait_ready()
+
+        if not self.settings.is_super_user(event.get_sender_id()):
+            yield event.plain_result("......抱歉，您没有权限使用此指令......")
+            return
+
+        parts = event.message_str.strip().split()
+        fmt = parts[1].lower() if len(parts) > 1 else "csv"
+        if fmt not in stats_io.FORMATS:
+            yield event.plain_result(f"......不支持的格式 '{parts[1]}'，可以使用: {' / '.join(stats_io.FORMATS)}")
+            return
+        if self._stats_io_lock.locked():
+            yield event.plain_result("......已经有一个导出或导入正在进行了，请稍后再试。")
+            return
+
+        output_path = self.export_dir / f"user_stats_{time.strftime('%Y%m%d_%H%M%S')}.{fmt}"
+        async with self._stats_io_lock:
+            try:
+                # 导出基于数据库快照，在线程中进行，不会阻塞游戏
+                rows = await asyncio.to_thread(stats_io.export_user_stats, self.db_path, output_path, fmt)
+            except Exception as e:
+                logger.error(f"导出玩家统计失败: {e}", exc_info=True)
+                rows = None
+        if rows is None:
+            yield event.plain_result("......导出失败了，请查看日志。")
+        else:
+            yield event.plain_result(f"......已导出 {rows} 条玩家数据到:\n{output_path}")
+
+    @filter.command("猜卡导入", alias={"gcimport"})
+    async def import_stats(self, event: AstrMessageEvent):
+        """从导出文件合并导入玩家统计数据（仅限管理员）"""
+        if not self._is_group_allowed(event):
+            return
+        await self._wait_ready()
+
+        if not self.settings.is_super_user(event.get_sender_id()):
+            yield event.plain_result("......抱歉，您没有权限使用此指令......")
+            return
+
+        parts = event.message_str.strip().split(maxsplit=1)
+        if len(parts) < 2:
+            yield event.plain_result(f"......请指定要导入的文件，相对路径以导出目录为准:\n{self.export_dir}")
+            return
+        input_path = Path(parts[1].strip())
+        if not input_path.is_absolute():
+            input_path = self.export_dir / input_path
+        if not input_path.is_file():
+            yield event.plain_result(f"......找不到文件 {input_path}")
+            return
+        if self._stats_io_lock.locked():
+            yield event.plain_result("......已经有一个导出或导入正在进行了，请稍后再试。")
+            return
+
+        error_text = None
+        async with self._stats_io_lock:
+            try:
+                rows = await asyncio.to_thread(stats_io.import_user_stats, self.db_path, input_path)
+            except stats_io.StatsFormatError as e:
+                error_text = f"......文件格式有误: {e}"
+            except Exception as e:
+                logger.error(f"导入玩家统计失败: {e}", exc_info=True)
+                error_text = "......导入失败了，请查看日志。已提交的部分不会回滚。"
+        if error_text:
+            yield event.plain_result(error_text)
+        else:
+            yield event.plain_result(f"......已合并导入 {rows} 条玩家数据。")
+
     @filter.command("猜卡排行榜", alias={"gcrank", "gctop"})
     async def show_ranking(self, event: AstrMessageEvent):
         """显示猜卡排行榜"""
         if not self._is_group_allowed(event):
             return
+        await self._wait_ready()
+
+        group_mode = self._parse_group_mode(event)
+        window_type = self._parse_ranking_window(event)
+        group_id = event.get_group_id()
+        if group_mode and not group_id:
+            yield event.plain_result("......本群排行榜只能在群聊中使用。")
+            return
 
         # 每次生成前都清理一次
         self._cleanup_output_dir()
 
         with self.get_conn() as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                "SELECT user_id, user_name, score, attempts, correct_attempts FROM user_stats ORDER BY score DESC LIMIT 10"
-            )
+            if window_type:
+                cursor.execute(
+                    "SELECT user_id, user_name, score, attempts, correct_attempts FROM windowed_user_stats "
+                    "WHERE window_type = ? AND period = ? AND group_id = ? ORDER BY score DESC LIMIT 10",
+                    (window_type, get_window_periods()[window_type], str(group_id) if group_mode else ""),
+                )
+            elif group_mode:
+                cursor.execute(
+                    "SELECT user_id, user_name, score, attempts, correct_attempts FROM group_user_stats "
+                    "WHERE group_id = ? ORDER BY score DESC LIMIT 10",
+                    (str(group_id),),
+                )
+            else:
+                cursor.execute(
+                    "SELECT user_id, user_name, score, attempts, correct_attempts FROM user_stats ORDER BY score DESC LIMIT 10"
+                )
             rows = cursor.fetchall()
 
+        window_label = RANKING_WINDOWS.get(window_type, "") if window_type else ""
         if not rows:
-            yield event.plain_result("......目前还没有人参与过猜卡游戏")
+            scope_text = "本群" if group_mode else ""
+            yield event.plain_result(f"......{scope_text}{window_label}目前还没有人参与过猜卡游戏")
             return
 
-        # --- 使用 Pillow 生成图片 ---
-        try:
-            # 1. 设置参数 (增加高度以容纳所有条目)
-            width, height = 650, 950
-
-            # 2. 创建默认的渐变背景
-            bg_color_start = (230, 240, 255)
-            bg_color_end = (200, 210, 240)
-            img = Image.new("RGB", (width, height), bg_color_start)
-            draw_bg = ImageDraw.Draw(img)
-            for y in range(height):
-                r = int(bg_color_start[0] + (bg_color_end[0] - bg_color_start[0]) * y / height)
-                g = int(bg_color_start[1] + (bg_color_end[1] - bg_color_start[1]) * y / height)
-                b = int(bg_color_start[2] + (bg_color_end[2] - bg_color_start[2]) * y / height)
-                draw_bg.line([(0, y), (width, y)], fill=(r, g, b))
-            
-            # 3. 检查并叠加半透明的自定义背景 (修正：强制从本地加载)
-            background_path = self.resources_dir / "ranking_bg.png"
-            if background_path.exists():
-                try:
-                    custom_bg = Image.open(background_path).convert("RGBA")
-                    custom_bg = custom_bg.resize((width, height), LANCZOS)
-                    
-                    # 设置自定义背景的透明度 (0-255)
-                    custom_bg.putalpha(128)
-                    
-                    # 将渐变背景转为RGBA并与自定义背景混合
-                    img = img.convert("RGBA")
-                    img = Image.alpha_composite(img, custom_bg)
-
-                except Exception as e:
-                    logger.warning(f"加载或混合自定义背景图片失败: {e}. 将仅使用默认背景。")
-
-            # 确保图像为RGBA模式以支持透明度
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-
-            # 3. (新) 叠加一层半透明白色蒙版以提高可读性
-            white_overlay = Image.new("RGBA", img.size, (255, 255, 255, 100)) # 调整透明度以获得泛白效果
-            img = Image.alpha_composite(img, white_overlay)
-
-            # 4. 设置文本和颜色
-            title_text = "猜卡排行榜"
-            font_color = (30, 30, 50)
-            shadow_color = (180, 180, 190, 128)
-            header_color = (80, 90, 120)
-            score_color = (235, 120, 20)
-            accuracy_color = (0, 128, 128)
-            
-            # 5. 准备字体
-            try:
-                font_path = self.resources_dir / "font.ttf"
-                title_font = ImageFont.truetype(str(font_path), 48)
-                header_font = ImageFont.truetype(str(font_path), 28)
-                body_font = ImageFont.truetype(str(font_path), 26)
-                id_font = ImageFont.truetype(str(font_path), 16)
-                medal_font = ImageFont.truetype(str(font_path), 36) # 为奖牌使用更大的字体
-            except IOError:
-                logger.error(f"主要字体文件未找到: {font_path}. 将使用默认字体。")
-                title_font, header_font, body_font, id_font = [ImageFont.load_default()] * 4
-                medal_font = body_font # 如果主字体加载失败，奖牌回退到正文字体
-
-            # 6. 使用 Pilmoji 进行绘制
-            with Pilmoji(img) as pilmoji:
-                # 绘制标题 (带阴影)
-                center_x, title_y = int(width / 2), 80
-                pilmoji.text((center_x + 2, title_y + 2), title_text, font=title_font, fill=shadow_color, anchor="mm", emoji_position_offset=(0, 6))
-                pilmoji.text((center_x, title_y), title_text, font=title_font, fill=font_color, anchor="mm", emoji_position_offset=(0, 6))
-
-                # 绘制表头
-                headers = ["排名", "玩家", "总分", "正确率", "总次数"]
-                col_positions_header = [40, 120, 320, 450, 560]
-                title_height = pilmoji.getsize(title_text, font=title_font)[1]
-                current_y = title_y + int(title_height / 2) + 45
-                for header in headers:
-                    pilmoji.text((col_positions_header.pop(0), current_y), header, font=header_font, fill=header_color)
-
-                current_y += 55
-
-                # 绘制排行榜数据
-                rank_icons = ["🥇", "🥈", "🥉"]
-                for i, row in enumerate(rows):
-                    user_id, user_name, score, attempts, correct_attempts = str(row[0]), row[1], str(row[2]), str(row[3]), row[4]
-                    accuracy = f"{(correct_attempts * 100 / int(attempts) if int(attempts) > 0 else 0):.1f}%"
-                    
-                    # --- 排名和奖牌对齐修正 ---
-                    rank = i + 1
-                    col_positions = [40, 120, 320, 450, 560]
-                    rank_num_align_x = 100 # 数字右对齐的位置
-
-                    # 绘制排名数字 (恢复之前的右上角对齐)
-                    pilmoji.text((rank_num_align_x, current_y), str(rank), font=body_font, fill=font_color, anchor="ra")
-
-                    # 为前三名绘制更大的奖牌 (使用默认的左上角对齐)
-                    if i < 3:
-                        # 使用更大的字体并微调Y轴位置以使其与数字视觉居中
-                        pilmoji.text((col_positions[0], current_y - 2), rank_icons[i], font=medal_font, fill=font_color)
-                    
-                    max_name_width = col_positions[2] - col_positions[1] - 20
-                    if body_font.getbbox(user_name)[2] > max_name_width:
-                        while body_font.getbbox(user_name + "...")[2] > max_name_width and len(user_name) > 0:
-                            user_name = user_name[:-1]
-                        user_name += "..."
-                    
-                    # 恢复之前的默认对齐方式 (移除所有 anchor)
-                    pilmoji.text((col_positions[1], current_y), user_name, font=body_font, fill=font_color)
-                    pilmoji.text((col_positions[1], current_y + 32), f"ID: {user_id}", font=id_font, fill=header_color)
-                    pilmoji.text((col_positions[2], current_y), score, font=body_font, fill=score_color)
-                    pilmoji.text((col_positions[3], current_y), accuracy, font=body_font, fill=accuracy_color)
-                    pilmoji.text((col_positions[4], current_y), attempts, font=body_font, fill=font_color)
-
-                    # 绘制分割线
-                    separator_y = current_y + 60
-                    if i < len(rows) - 1:
-                        draw = ImageDraw.Draw(img) # 需要一个普通Draw对象来画线
-                        draw.line([(30, separator_y), (width - 30, separator_y)], fill=(200, 200, 210, 128), width=1)
-                    
-                    current_y += 70
-
-                # 绘制页脚
-                footer_text = f"GuessCard v{PLUGIN_VERSION} | Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                footer_y = height - 25
-                pilmoji.text((center_x, footer_y), footer_text, font=id_font, fill=header_color, anchor="ms")
-
-            # Pilmoji 上下文管理器会自动处理保存
-            # 保存并发送图片
-            output_dir = self.plugin_dir / "output"
-            os.makedirs(output_dir, exist_ok=True)
-            img_path = output_dir / f"ranking_{int(time.time())}.png"
-            img.save(img_path)
-
-            yield event.image_result(str(img_path))
+        title_text = "本群猜卡排行榜" if group_mode else "猜卡排行榜"
+        if window_label:
+            title_text += f"（{window_label}）"
 
+        try:
+            img_path = self._render_ranking_image(rows, title_text)
+            yield event.image_result(img_path)
         except Exception as e:
             logger.error(f"使用Pillow生成排行榜图片失败: {e}", exc_info=True)
             yield event.plain_result("生成排行榜图片时出错，请联系管理员。")
+
+    def _render_ranking_image(self, rows: List[Tuple], title_text: str) -> str:
+        """使用 Pillow 将排行榜数据 (user_id, user_name, score, attempts, correct_attempts) 渲染为图片，返回图片路径"""
+        from PIL import Image, ImageDraw, ImageFont
+        from pilmoji import Pilmoji
+
+        # 1. 设置参数 (增加高度以容纳所有条目)
+        width, height = 650, 950
+
+        # 2. 创建默认的渐变背景
+        bg_color_start = (230, 240, 255)
+        bg_color_end = (200, 210, 240)
+        img = Image.new("RGB", (width, height), bg_color_start)
+        draw_bg = ImageDraw.Draw(img)
+        for y in range(height):
+            r = int(bg_color_start[0] + (bg_color_end[0] - bg_color_start[0]) * y / height)
+            g = int(bg_color_start[1] + (bg_color_end[1] - bg_color_start[1]) * y / height)
+            b = int(bg_color_start[2] + (bg_color_end[2] - bg_color_start[2]) * y / height)
+            draw_bg.line([(0, y), (width, y)], fill=(r, g, b))
+        
+        # 3. 检查并叠加半透明的自定义背景 (修正：强制从本地加载)
+        background_path = self.resources_dir / "ranking_bg.png"
+        if background_path.exists():
+            try:
+                custom_bg = Image.open(background_path).convert("RGBA")
+                custom_bg = custom_bg.resize((width, height), get_lanczos())
+                
+                # 设置自定义背景的透明度 (0-255)
+                custom_bg.putalpha(128)
+                
+                # 将渐变背景转为RGBA并与自定义背景混合
+                img = img.convert("RGBA")
+                img = Image.alpha_composite(img, custom_bg)
+
+            except Exception as e:
+                logger.warning(f"加载或混合自定义背景图片失败: {e}. 将仅使用默认背景。")
+
+        # 确保图像为RGBA模式以支持透明度
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
+
+        # 3. (新) 叠加一层半透明白色蒙版以提高可读性
+        white_overlay = Image.new("RGBA", img.size, (255, 255, 255, 100)) # 调整透明度以获得泛白效果
+        img = Image.alpha_composite(img, white_overlay)
+
+        # 4. 设置文本和颜色
+        font_color = (30, 30, 50)
+        shadow_color = (180, 180, 190, 128)
+        header_color = (80, 90, 120)
+        score_color = (235, 120, 20)
+        accuracy_color = (0, 128, 128)
+        
+        # 5. 准备字体
+        try:
+            font_path = self.resources_dir / "font.ttf"
+            title_font = ImageFont.truetype(str(font_path), 48)
+            header_font = ImageFont.truetype(str(font_path), 28)
+            body_font = ImageFont.truetype(str(font_path), 26)
+            id_font = ImageFont.truetype(str(font_path), 16)
+            medal_font = ImageFont.truetype(str(font_path), 36) # 为奖牌使用更大的字体
+        except IOError:
+            logger.error(f"主要字体文件未找到: {font_path}. 将使用默认字体。")
+            title_font, header_font, body_font, id_font = [ImageFont.load_default()] * 4
+            medal_font = body_font # 如果主字体加载失败，奖牌回退到正文字体
+
+        # 6. 使用 Pilmoji 进行绘制
+        with Pilmoji(img) as pilmoji:
+            # 绘制标题 (带阴影)
+            center_x, title_y = int(width / 2), 80
+            pilmoji.text((center_x + 2, title_y + 2), title_text, font=title_font, fill=shadow_color, anchor="mm", emoji_position_offset=(0, 6))
+            pilmoji.text((center_x, title_y), title_text, font=title_font, fill=font_color, anchor="mm", emoji_position_offset=(0, 6))
+
+            # 绘制表头
+            headers = ["排名", "玩家", "总分", "正确率", "总次数"]
+            col_positions_header = [40, 120, 320, 450, 560]
+            title_height = pilmoji.getsize(title_text, font=title_font)[1]
+            current_y = title_y + int(title_height / 2) + 45
+            for header in headers:
+                pilmoji.text((col_positions_header.pop(0), current_y), header, font=header_font, fill=header_color)
+
+            current_y += 55
+
+            # 绘制排行榜数据
+            rank_icons = ["🥇", "🥈", "🥉"]
+            for i, row in enumerate(rows):
+                user_id, user_name, score, attempts, correct_attempts = str(row[0]), row[1], str(row[2]), str(row[3]), row[4]
+                accuracy = f"{(correct_attempts * 100 / int(attempts) if int(attempts) > 0 else 0):.1f}%"
+                
+                # --- 排名和奖牌对齐修正 ---
+                rank = i + 1
+                col_positions = [40, 120, 320, 450, 560]
+                rank_num_align_x = 100 # 数字右对齐的位置
+
+                # 绘制排名数字 (恢复之前的右上角对齐)
+                pilmoji.text((rank_num_align_x, current_y), str(rank), font=body_font, fill=font_color, anchor="ra")
+
+                # 为前三名绘制更大的奖牌 (使用默认的左上角对齐)
+                if i < 3:
+                    # 使用更大的字体并微调Y轴位置以使其与数字视觉居中
+                    pilmoji.text((col_positions[0], current_y - 2), rank_icons[i], font=medal_font, fill=font_color)
+                
+                max_name_width = col_positions[2] - col_positions[1] - 20
+                if body_font.getbbox(user_name)[2] > max_name_width:
+                    while body_font.getbbox(user_name + "...")[2] > max_name_width and len(user_name) > 0:
+                        user_name = user_name[:-1]
+                    user_name += "..."
+                
+                # 恢复之前的默认对齐方式 (移除所有 anchor)
+                pilmoji.text((col_positions[1], current_y), user_name, font=body_font, fill=font_color)
+                pilmoji.text((col_positions[1], current_y + 32), f"ID: {user_id}", font=id_font, fill=header_color)
+                pilmoji.text((col_positions[2], current_y), score, font=body_font, fill=score_color)
+                pilmoji.text((col_positions[3], current_y), accuracy, font=body_font, fill=accuracy_color)
+                pilmoji.text((col_positions[4], current_y), attempts, font=body_font, fill=font_color)
+
+                # 绘制分割线
+                separator_y = current_y + 60
+                if i < len(rows) - 1:
+                    draw = ImageDraw.Draw(img) # 需要一个普通Draw对象来画线
+                    draw.line([(30, separator_y), (width - 30, separator_y)], fill=(200, 200, 210, 128), width=1)
+                
+                current_y += 70
+
+            # 绘制页脚
+            footer_text = f"GuessCard v{PLUGIN_VERSION} | Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+            footer_y = height - 25
+            pilmoji.text((center_x, footer_y), footer_text, font=id_font, fill=header_color, anchor="ms")
+
+        # Pilmoji 上下文管理器会自动处理保存
+        # 保存并发送图片
+        output_dir = self.plugin_dir / "output"
+        os.makedirs(output_dir, exist_ok=True)
+        # 不同群的排行榜内容不同，文件名需保证唯一
+        img_path = output_dir / f"ranking_{time.time_ns()}.png"
+        img.save(img_path)
+        return str(img_path)
             
     # --- 数据更新与检查 ---
     def _record_game_start(self, user_id: str, user_name: str):
@@ -959,38 +1693,106 @@ class GuessCardPlugin(Star):  # type: ignore
                 )
             conn.commit()
 
-    def _update_stats(self, user_id: str, user_name: str, score: int, correct: bool):
-        """更新用户的得分和总尝试次数统计"""
+    def _update_stats(self, user_id: str, user_name: str, score: int, correct: bool, group_id: Optional[str] = None):
+        """更新用户的得分和总尝试次数统计。在群聊中同时更新该群的统计，两者在同一事务中提交"""
+        self._update_stats_batch([(user_id, user_name, score, correct, group_id)])
+
+    def _update_stats_batch(self, updates: List[Tuple[str, str, int, bool, Optional[str]]]):
+        """
+        在一个事务中提交多次作答 (user_id, user_name, score, correct, group_id) 的统计。
+        同一用户的多次作答先在内存中合并，每张表每个用户只写一行。
+        """
+        if not updates:
+            return
+
+        def add(totals: Dict, key, user_name: str, score: int, correct: bool):
+            entry = totals.get(key)
+            if entry is None:
+                entry = totals[key] = [user_name, 0, 0, 0]
+            entry[0] = user_name # 使用最新的昵称
+            entry[1] += score
+            entry[2] += 1
+            entry[3] += 1 if correct else 0
+
+        user_totals: Dict[str, List] = {}
+        scope_totals: Dict[Tuple[str, str], List] = {} # (group_id 或 '' 表示全服, user_id)
+        for user_id, user_name, score, correct, group_id in updates:
+            add(user_totals, user_id, user_name, score, correct)
+            add(scope_totals, ("", user_id), user_name, score, correct)
+            if group_id:
+                add(scope_totals, (str(group_id), user_id), user_name, score, correct)
+
         with self.get_conn() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT score, attempts, correct_attempts FROM user_stats WHERE user_id = ?", (user_id,))
-            user_data = cursor.fetchone()
+            # 如果一个未开始过游戏的用户直接回答，也为他创建记录，但每日游戏次数为0
+            today = time.strftime("%Y-%m-%d")
+            cursor.executemany(
+                """
+                INSERT INTO user_stats (user_id, user_name, score, attempts, correct_attempts, last_play_date, daily_plays)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    user_name = excluded.user_name,
+                    score = score + excluded.score,
+                    attempts = attempts + excluded.attempts,
+                    correct_attempts = correct_attempts + excluded.correct_attempts
+                """,
+                [
+                    (user_id, user_name, score, attempts, correct, today)
+                    for user_id, (user_name, score, attempts, correct) in user_totals.items()
+                ],
+            )
 
-            if user_data:
-                new_score = user_data[0] + score
-                new_attempts = user_data[1] + 1
-                new_correct = user_data[2] + (1 if correct else 0)
+            cursor.executemany(
+                """
+                INSERT INTO group_user_stats (group_id, user_id, user_name, score, attempts, correct_attempts)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (group_id, user_id) DO UPDATE SET
+                    user_name = excluded.user_name,
+                    score = score + excluded.score,
+                    attempts = attempts + excluded.attempts,
+                    correct_attempts = correct_attempts + excluded.correct_attempts
+                """,
+                [
+                    (scope, user_id, user_name, score, attempts, correct)
+                    for (scope, user_id), (user_name, score, attempts, correct) in scope_totals.items()
+                    if scope
+                ],
+            )
 
+            # 同一事务内累加日/周/月汇总 (全服与本群)
+            cursor.executemany(
+                """
+                INSERT INTO windowed_user_stats (window_type, period, group_id, user_id, user_name, score, attempts, correct_attempts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (window_type, period, group_id, user_id) DO UPDATE SET
+                    user_name = excluded.user_name,
+                    score = score + excluded.score,
+                    attempts = attempts + excluded.attempts,
+                    correct_attempts = correct_attempts + excluded.correct_attempts
+                """,
+                [
+                    (window_type, period, scope, user_id, user_name, score, attempts, correct)
+                    for window_type, period in get_window_periods().items()
+                    for (scope, user_id), (user_name, score, attempts, correct) in scope_totals.items()
+                ],
+            )
+            conn.commit()
+
+    def _prune_windowed_stats(self):
+        """删除早于上一周期的日/周/月汇总数据"""
+        previous_periods = get_previous_window_periods()
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            for window_type, period in previous_periods.items():
                 cursor.execute(
-                    """
-                    UPDATE user_stats 
-                    SET score = ?, attempts = ?, correct_attempts = ?, user_name = ?
-                    WHERE user_id = ?
-                    """,
-                    (new_score, new_attempts, new_correct, user_name, user_id),
-                )
-            else:
-                # 如果一个未开始过游戏的用户直接回答，也为他创建记录，但每日游戏次数为0
-                today = time.strftime("%Y-%m-%d")
-                cursor.execute(
-                    "INSERT INTO user_stats (user_id, user_name, score, attempts, correct_attempts, last_play_date, daily_plays) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (user_id, user_name, score, 1, 1 if correct else 0, today, 0),
+                    "DELETE FROM windowed_user_stats WHERE window_type = ? AND period < ?",
+                    (window_type, period),
                 )
             conn.commit()
 
     def _can_play(self, user_id: str) -> bool:
         """检查用户今天是否还能玩"""
-        daily_limit = self.config.get("daily_play_limit", 10)
+        daily_limit = self.settings.daily_play_limit
         with self.get_conn() as conn:
             cursor = conn.cursor()
             today = time.strftime("%Y-%m-%d")
@@ -1016,8 +1818,12 @@ class GuessCardPlugin(Star):  # type: ignore
         logger.info("正在关闭猜卡插件的后台任务...")
         if self._cleanup_task:
             self._cleanup_task.cancel()
-        if self.http_session and not self.http_session.closed:
-            await self.http_session.close()
-            logger.info("aiohttp session已关闭。")
+        if not self._init_task.done():
+            await self._init_task # 避免初始化线程在关闭后才打开资源包
+        await self.round_history.close()
+        await self.fetch_client.close()
+        logger.info("aiohttp session已关闭。")
+        if self.asset_pack is not None:
+            self.asset_pack.close()
         logger.info("猜卡插件已终止。")
         pass
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+猜卡对局历史记录。
+
+每局结束后生成一条 RoundRecord, 由 RoundHistoryWriter 放入内存队列, 后台任务按批量
+(条数或时间间隔先到者) 在线程中用 executemany 写入 game_rounds 表, 答题路径不会等待数据库。
+超过保留期的明细由 compact() 汇总进 game_rounds_daily 后删除。
+表结构由 main.init_db 创建。
+"""
+import asyncio
+import sqlite3
+import time
+from dataclasses import astuple, dataclass
+from typing import List, Optional
+
+from astrbot.api import logger
+
+
+@dataclass
+class RoundRecord:
+    session_id: str
+    group_id: Optional[str]
+    card_id: int
+    character_id: int
+    difficulty: str
+    card_state: str
+    show_rarity_hint: bool
+    show_training_hint: bool
+    winner_id: Optional[str]
+    attempts: int
+    outcome: str  # correct / timeout / attempts
+    started_at: float
+    duration: float
+
+
+_INSERT_SQL = """
+    INSERT INTO game_rounds (
+        session_id, group_id, card_id, character_id, difficulty, card_state,
+        show_rarity_hint, show_training_hint, winner_id, attempts, outcome, started_at, duration
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_COMPACT_SQL = """
+    INSERT INTO game_rounds_daily (
+        day, difficulty, show_rarity_hint, show_training_hint,
+        rounds, solved_rounds, total_attempts, total_duration
+    )
+    SELECT
+        date(started_at, 'unixepoch', 'localtime') AS day, difficulty, show_rarity_hint, show_training_hint,
+        COUNT(*), SUM(winner_id IS NOT NULL), SUM(attempts), SUM(duration)
+    FROM game_rounds
+    WHERE started_at < ?
+    GROUP BY day, difficulty, show_rarity_hint, show_training_hint
+    ON CONFLICT (day, difficulty, show_rarity_hint, show_training_hint) DO UPDATE SET
+        rounds = rounds + excluded.rounds,
+        solved_rounds = solved_rounds + excluded.solved_rounds,
+        total_attempts = total_attempts + excluded.total_attempts,
+        total_duration = total_duration + excluded.total_duration
+"""
+
+
+class RoundHistoryWriter:
+    """异步批量写入对局历史。record() 不会阻塞, 队列满时丢弃新记录。"""
+
+    def __init__(self, db_path: str, batch_size: int = 200, flush_interval: float = 5.0, max_queue: int = 10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # 队列中的 None 是停止信号
+        self._queue: "asyncio.Queue[Optional[RoundRecord]]" = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def record(self, record: RoundRecord):
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            logger.warning("对局历史写入队列已满，丢弃一条记录。")
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._write(batch)
+
+    async def _write(self, batch: List[RoundRecord]):
+        try:
+            await asyncio.to_thread(self._insert_batch, [astuple(r) for r in batch])
+        except Exception as e:
+            logger.error(f"写入 {len(batch)} 条对局历史失败: {e}", exc_info=True)
+
+    def _insert_batch(self, rows: List[tuple]):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(_INSERT_SQL, rows)
+            conn.commit()
+
+    async def close(self):
+        """写入队列中剩余的记录并停止后台任务"""
+        if self._task is None:
+            return
+        # 通过停止信号而不是 cancel() 结束，保证已出队的记录不会丢失
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def compact(self, retention_days: int) -> int:
+        """将早于保留期的明细汇总进 game_rounds_daily 并删除，返回被压缩的行数。应在线程中调用。"""
+        cutoff = time.time() - retention_days * 86400
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(_COMPACT_SQL, (cutoff,))
+            deleted = conn.execute("DELETE FROM game_rounds WHERE started_at < ?", (cutoff,)).rowcount
+            conn.commit()
+        return deleted
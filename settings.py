@@ -0,0 +1,87 @@
+"""
+插件配置快照。
+
+AstrBot 的配置对象是一个可变的 dict, 每次读取都要查找键并做类型转换。PluginSettings 在插件加载
+时把它编译为一个不可变的快照: 整数项经过校验, 白名单与管理员列表转为 frozenset,
+指令处理时只需读取属性和做一次集合查找。AstrBot 保存配置后会重新实例化插件, 快照随之重建。
+"""
+from dataclasses import dataclass
+from typing import Any, FrozenSet, Mapping, Tuple
+
+from astrbot.api import logger
+
+
+def _int_option(config: Mapping[str, Any], key: str, default: int, minimum: int = 0) -> int:
+    value = config.get(key, default)
+    try:
+        # bool 是 int 的子类，但 true/false 显然不是有效的数值配置
+        if isinstance(value, bool):
+            raise ValueError
+        parsed = int(value)
+    except (TypeError, ValueError):
+        logger.warning(f"配置项 {key} 的值 {value!r} 不是整数，将使用默认值 {default}。")
+        return default
+    if parsed < minimum:
+        logger.warning(f"配置项 {key} 的值 {parsed} 小于 {minimum}，将使用 {minimum}。")
+        return minimum
+    return parsed
+
+
+def _id_set(config: Mapping[str, Any], key: str) -> FrozenSet[str]:
+    value = config.get(key) or []
+    if isinstance(value, (str, int)):
+        value = [value]
+    return frozenset(str(item).strip() for item in value if str(item).strip())
+
+
+@dataclass(frozen=True)
+class PluginSettings:
+    group_whitelist: FrozenSet[str]
+    super_users: FrozenSet[str]
+    answer_timeout: int
+    daily_play_limit: int
+    game_cooldown_seconds: int
+    max_guess_attempts: int
+    marathon_max_rounds: int
+    use_local_resources: bool
+    remote_resource_url_base: str
+    remote_timeout_seconds: int
+    remote_max_retries: int
+    history_retention_days: int
+    recent_card_window: int
+    difficulty_weights: Tuple[Any, ...]
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "PluginSettings":
+        weights = config.get("difficulty_weights", [1, 1, 1])
+        return cls(
+            group_whitelist=_id_set(config, "group_whitelist"),
+            super_users=_id_set(config, "super_users"),
+            answer_timeout=_int_option(config, "answer_timeout", 30, minimum=1),
+            daily_play_limit=_int_option(config, "daily_play_limit", 10),
+            game_cooldown_seconds=_int_option(config, "game_cooldown_seconds", 60),
+            max_guess_attempts=_int_option(config, "max_guess_attempts", 10, minimum=1),
+            marathon_max_rounds=_int_option(config, "marathon_max_rounds", 20),
+            use_local_resources=bool(config.get("use_local_resources", True)),
+            remote_resource_url_base=str(config.get("remote_resource_url_base") or "").strip().rstrip("/"),
+            remote_timeout_seconds=_int_option(config, "remote_timeout_seconds", 10, minimum=1),
+            remote_max_retries=_int_option(config, "remote_max_retries", 2),
+            history_retention_days=_int_option(config, "history_retention_days", 30, minimum=1),
+            recent_card_window=_int_option(config, "recent_card_window", 20),
+            difficulty_weights=tuple(weights) if isinstance(weights, (list, tuple)) else (weights,),
+        )
+
+    def is_group_allowed(self, group_id) -> bool:
+        """
+        白名单为空时允许所有群聊和私聊；
+        白名单不为空时只允许白名单内的群聊，私聊 (group_id 为空) 一律不允许。
+        """
+        if not self.group_whitelist:
+            return True
+        if not group_id:
+            return False
+        # 平台给出的 ID 通常已是 str，此时不做转换
+        return (group_id if type(group_id) is str else str(group_id)) in self.group_whitelist
+
+    def is_super_user(self, user_id) -> bool:
+        return (user_id if type(user_id) is str else str(user_id)) in self.super_users
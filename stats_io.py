@@ -0,0 +1,232 @@
+"""
+玩家统计 (user_stats) 的批量导出与导入。
+
+- 导出: 先用 SQLite 在线备份 API 一次性把数据库复制为一个快照 (复制期间持有读锁,
+  机器人的写入会等待这一次页拷贝完成), 再从快照中用 fetchmany 分块读取, 流式写出为 CSV 或 JSONL;
+  分步备份在其他连接写入时会从头重来, 写入频繁时可能永远无法完成, 因此不使用;
+- 导入: 流式读取 CSV/JSONL, 分块 executemany 写入, 每若干行提交一次事务。
+  与已有记录合并: 分数、尝试次数与答对次数相加, last_play_date 取较晚者,
+  昵称与每日游戏次数以 last_play_date 较晚的一方为准。
+
+两者的内存占用都只与分块大小有关, 与总行数无关。
+
+用法:
+    python stats_io.py export /path/to/guess_card_data.db user_stats.csv
+    python stats_io.py import /path/to/guess_card_data.db user_stats.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import closing
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+USER_STATS_COLUMNS = (
+    "user_id", "user_name", "score", "attempts", "correct_attempts", "last_play_date", "daily_plays",
+)
+INT_COLUMNS = {"score", "attempts", "correct_attempts", "daily_plays"}
+FORMATS = ("csv", "jsonl")
+
+_SELECT_SQL = f"SELECT {', '.join(USER_STATS_COLUMNS)} FROM user_stats"
+
+_MERGE_SQL = f"""
+    INSERT INTO user_stats ({', '.join(USER_STATS_COLUMNS)})
+    VALUES ({', '.join('?' for _ in USER_STATS_COLUMNS)})
+    ON CONFLICT (user_id) DO UPDATE SET
+        user_name = CASE
+            WHEN COALESCE(excluded.last_play_date, '') >= COALESCE(last_play_date, '') THEN excluded.user_name
+            ELSE user_name
+        END,
+        score = score + excluded.score,
+        attempts = attempts + excluded.attempts,
+        correct_attempts = correct_attempts + excluded.correct_attempts,
+        daily_plays = CASE
+            WHEN COALESCE(excluded.last_play_date, '') > COALESCE(last_play_date, '') THEN excluded.daily_plays
+            WHEN COALESCE(excluded.last_play_date, '') = COALESCE(last_play_date, '') THEN MAX(daily_plays, excluded.daily_plays)
+            ELSE daily_plays
+        END,
+        last_play_date = NULLIF(MAX(COALESCE(last_play_date, ''), COALESCE(excluded.last_play_date, '')), '')
+"""
+
+
+class StatsFormatError(ValueError):
+    """导入文件的格式不正确。"""
+
+
+def detect_format(path: Union[str, Path], fmt: Optional[str] = None) -> str:
+    """未指定格式时按扩展名判断"""
+    fmt = (fmt or Path(path).suffix.lstrip(".")).lower()
+    if fmt == "json":
+        fmt = "jsonl"
+    if fmt not in FORMATS:
+        raise StatsFormatError(f"无法识别的格式 {fmt!r}，支持: {', '.join(FORMATS)}")
+    return fmt
+
+
+# --- 导出 ---
+def snapshot_database(db_path: Union[str, Path], snapshot_path: Union[str, Path]):
+    """
+    用在线备份 API 一步复制整个数据库 (pages=-1)。
+    整个复制在同一个读事务中完成，不会因为其他连接的写入而重新开始；复制期间写入方按 busy timeout 等待。
+    """
+    with closing(sqlite3.connect(db_path, timeout=30)) as src, closing(sqlite3.connect(snapshot_path)) as dst:
+        src.backup(dst, pages=-1)
+
+
+def iter_user_stats(conn: sqlite3.Connection, chunk_size: int = 5000) -> Iterator[Tuple]:
+    cursor = conn.execute(_SELECT_SQL)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def export_user_stats(db_path: Union[str, Path], output_path: Union[str, Path], fmt: Optional[str] = None,
+                      chunk_size: int = 5000) -> int:
+    """将 user_stats 导出到 output_path，返回导出的行数。输出先写入临时文件，完成后原子替换"""
+    output_path = Path(output_path)
+    fmt = detect_format(output_path, fmt)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, snapshot_path = tempfile.mkstemp(prefix=".user_stats_", suffix=".snapshot.db", dir=output_path.parent)
+    os.close(fd)
+    tmp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+    count = 0
+    try:
+        snapshot_database(db_path, snapshot_path)
+        with closing(sqlite3.connect(snapshot_path)) as conn, open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                writer = csv.writer(f)
+                writer.writerow(USER_STATS_COLUMNS)
+                for row in iter_user_stats(conn, chunk_size):
+                    writer.writerow(row)
+                    count += 1
+            else:
+                for row in iter_user_stats(conn, chunk_size):
+                    f.write(json.dumps(dict(zip(USER_STATS_COLUMNS, row)), ensure_ascii=False))
+                    f.write("\n")
+                    count += 1
+        os.replace(tmp_path, output_path)
+    finally:
+        for path in (tmp_path, Path(snapshot_path)):
+            if path.exists():
+                os.remove(path)
+    return count
+
+
+# --- 导入 ---
+def _normalize(record: Dict, line: int) -> Tuple:
+    user_id = record.get("user_id")
+    if user_id is None or str(user_id).strip() == "":
+        raise StatsFormatError(f"第 {line} 行缺少 user_id")
+    values = []
+    for column in USER_STATS_COLUMNS:
+        value = record.get(column)
+        if value == "":
+            value = None
+        if column in INT_COLUMNS:
+            try:
+                value = int(value) if value is not None else 0
+            except (TypeError, ValueError):
+                raise StatsFormatError(f"第 {line} 行的 {column} 不是整数: {value!r}")
+        elif value is not None:
+            value = str(value)
+        values.append(value)
+    return tuple(values)
+
+
+def read_user_stats(input_path: Union[str, Path], fmt: Optional[str] = None) -> Iterator[Tuple]:
+    """流式读取导出文件，逐行产出与 USER_STATS_COLUMNS 对应的元组"""
+    fmt = detect_format(input_path, fmt)
+    with open(input_path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or "user_id" not in reader.fieldnames:
+                raise StatsFormatError("CSV 文件缺少 user_id 列")
+            for line, record in enumerate(reader, 2):
+                yield _normalize(record, line)
+        else:
+            for line, text in enumerate(f, 1):
+                if not text.strip():
+                    continue
+                try:
+                    record = json.loads(text)
+                except json.JSONDecodeError as e:
+                    raise StatsFormatError(f"第 {line} 行不是有效的 JSON: {e}") from e
+                if not isinstance(record, dict):
+                    raise StatsFormatError(f"第 {line} 行不是 JSON 对象")
+                yield _normalize(record, line)
+
+
+def merge_user_stats(db_path: Union[str, Path], rows: Iterable[Tuple], chunk_size: int = 5000,
+                     rows_per_transaction: int = 50000) -> int:
+    """
+    将 rows 合并进 user_stats，返回处理的行数。
+    每 rows_per_transaction 行提交一次；出错时只回滚当前事务，之前提交的部分保留。
+    """
+    rows = iter(rows)
+    count = 0
+    with closing(sqlite3.connect(db_path, timeout=30)) as conn:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'").fetchone()
+        if not exists:
+            raise StatsFormatError(f"{db_path} 中没有 user_stats 表，请先启动一次插件以初始化数据库")
+        in_transaction = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            conn.executemany(_MERGE_SQL, chunk)
+            count += len(chunk)
+            in_transaction += len(chunk)
+            if in_transaction >= rows_per_transaction:
+                conn.commit()
+                in_transaction = 0
+        conn.commit()
+    return count
+
+
+def import_user_stats(db_path: Union[str, Path], input_path: Union[str, Path], fmt: Optional[str] = None,
+                      chunk_size: int = 5000, rows_per_transaction: int = 50000) -> int:
+    return merge_user_stats(db_path, read_user_stats(input_path, fmt), chunk_size, rows_per_transaction)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出或导入猜卡玩家统计 (user_stats)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="导出为 CSV 或 JSONL")
+    export.add_argument("db", type=Path, help="guess_card_data.db 的路径")
+    export.add_argument("output", type=Path, help="输出文件")
+    export.add_argument("--format", choices=FORMATS, default=None, help="默认按输出文件扩展名判断")
+    export.add_argument("--chunk-size", type=int, default=5000, help="每次读取的行数")
+
+    merge = subparsers.add_parser("import", help="从 CSV 或 JSONL 合并导入")
+    merge.add_argument("db", type=Path, help="guess_card_data.db 的路径")
+    merge.add_argument("input", type=Path, help="输入文件")
+    merge.add_argument("--format", choices=FORMATS, default=None, help="默认按输入文件扩展名判断")
+    merge.add_argument("--chunk-size", type=int, default=5000, help="每次 executemany 的行数")
+    merge.add_argument("--transaction-rows", type=int, default=50000, help="每个事务提交的行数")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        if args.command == "export":
+            rows = export_user_stats(args.db, args.output, args.format, args.chunk_size)
+        else:
+            rows = import_user_stats(args.db, args.input, args.format, args.chunk_size, args.transaction_rows)
+    except (OSError, sqlite3.Error, StatsFormatError) as e:
+        print(f"{args.command} 失败: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps({"command": args.command, "rows": rows, "seconds": round(time.perf_counter() - started, 2)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())